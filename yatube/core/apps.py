@@ -1,5 +1,21 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_migrate
+
+
+def clear_caches(**kwargs):
+    # Кэш переживает перезапуск процессов, а после миграций
+    # сохранённые страницы и счётчики могут не соответствовать базе.
+    # Тестовая база создаётся с чистым временным кэшем.
+    if getattr(settings, 'TESTING', False):
+        return
+    for alias in settings.CACHES:
+        caches[alias].clear()
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        post_migrate.connect(clear_caches, sender=self)
@@ -0,0 +1,468 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+# Как часто (в секундах) обновлять время последнего обращения к ключу.
+# Чтение без записи дешевле, а LRU с точностью до секунды нам хватает.
+ACCESS_RESOLUTION = 1
+# Размер таблицы проверяется не на каждой записи, а раз в CULL_EVERY.
+CULL_EVERY = 16
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL
+    )''',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+)
+
+
+class SQLiteCache(BaseCache):
+    """Кэш в файле SQLite (WAL), общий для всех процессов на машине.
+
+    В отличие от LocMemCache, воркеры видят одни и те же данные,
+    поэтому инвалидация в одном процессе доходит до всех. Размер
+    ограничен MAX_ENTRIES: сначала удаляются просроченные ключи,
+    затем давно не читанные (LRU).
+
+        CACHES = {'default': {
+            'BACKEND': 'core.cache.SQLiteCache',
+            'LOCATION': '/var/tmp/yatube-cache.sqlite3',
+        }}
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self.location = location
+        self._local = threading.local()
+
+    @property
+    def _db(self):
+        # Соединение своё у каждого потока и у каждого процесса:
+        # после fork унаследованным пользоваться нельзя.
+        pid = os.getpid()
+        if getattr(self._local, 'pid', None) != pid:
+            directory = os.path.dirname(self.location)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            db = sqlite3.connect(
+                self.location, timeout=30, isolation_level=None
+            )
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            for statement in SCHEMA:
+                db.execute(statement)
+            self._local.db = db
+            self._local.pid = pid
+            self._local.writes = 0
+        return self._local.db
+
+    @contextmanager
+    def _write(self):
+        # BEGIN IMMEDIATE сразу берёт блокировку записи: чтение и
+        # запись внутри транзакции атомарны для всех процессов.
+        db = self._db
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _dumps(self, value):
+        return pickle.dumps(value, self.pickle_protocol)
+
+    @staticmethod
+    def _alive(expires, now):
+        return expires is None or expires > now
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def get_many(self, keys, version=None):
+        made = {self._key(key, version): key for key in keys}
+        if not made:
+            return {}
+        now = time.time()
+        placeholders = ', '.join('?' * len(made))
+        rows = self._db.execute(
+            f'SELECT key, value, expires, accessed FROM cache '
+            f'WHERE key IN ({placeholders})',
+            list(made)
+        ).fetchall()
+        found, expired, touched = {}, [], []
+        for made_key, value, expires, accessed in rows:
+            if not self._alive(expires, now):
+                expired.append(made_key)
+                continue
+            found[made[made_key]] = pickle.loads(value)
+            if now - accessed > ACCESS_RESOLUTION:
+                touched.append(made_key)
+        if expired or touched:
+            with self._write() as db:
+                db.executemany(
+                    'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                    [(made_key, now) for made_key in expired]
+                )
+                db.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, made_key) for made_key in touched]
+                )
+        return found
+
+    def _store(self, db, key, value, timeout, mode):
+        expires = self.get_backend_timeout(timeout)
+        db.execute(
+            f'INSERT OR {mode} INTO cache (key, value, expires, accessed) '
+            f'VALUES (?, ?, ?, ?)',
+            (key, self._dumps(value), expires, time.time())
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._write() as db:
+            for key, value in data.items():
+                self._store(
+                    db, self._key(key, version), value, timeout, 'REPLACE'
+                )
+            self._cull(db, len(data))
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._write() as db:
+            db.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time())
+            )
+            self._store(db, key, value, timeout, 'IGNORE')
+            added = db.execute('SELECT changes()').fetchone()[0] == 1
+            if added:
+                self._cull(db, 1)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        now = time.time()
+        with self._write() as db:
+            db.execute(
+                'UPDATE cache SET expires = ?, accessed = ? '
+                'WHERE key = ? AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), now, key, now)
+            )
+            return db.execute('SELECT changes()').fetchone()[0] == 1
+
+    def incr(self, key, delta=1, version=None):
+        made_key = self._key(key, version)
+        with self._write() as db:
+            row = db.execute(
+                'SELECT value, expires FROM cache WHERE key = ?', (made_key,)
+            ).fetchone()
+            if row is None or not self._alive(row[1], time.time()):
+                raise ValueError(f"Key '{key}' not found")
+            value = pickle.loads(row[0]) + delta
+            db.execute(
+                'UPDATE cache SET value = ? WHERE key = ?',
+                (self._dumps(value), made_key)
+            )
+        return value
+
+    def has_key(self, key, version=None):
+        row = self._db.execute(
+            'SELECT expires FROM cache WHERE key = ?',
+            (self._key(key, version),)
+        ).fetchone()
+        return row is not None and self._alive(row[0], time.time())
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def delete_many(self, keys, version=None):
+        made = [(self._key(key, version),) for key in keys]
+        if made:
+            with self._write() as db:
+                db.executemany('DELETE FROM cache WHERE key = ?', made)
+
+    def clear(self):
+        with self._write() as db:
+            db.execute('DELETE FROM cache')
+
+    def _cull(self, db, written):
+        self._local.writes += written
+        if self._local.writes < CULL_EVERY:
+            return
+        self._local.writes = 0
+        db.execute('DELETE FROM cache WHERE expires <= ?', (time.time(),))
+        count = db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if count <= self._max_entries:
+            return
+        # Как и другие бэкенды Django, убираем сразу 1/CULL_FREQUENCY
+        # записей (0 — все), чтобы не чистить на каждой следующей.
+        excess = count - self._max_entries
+        if self._cull_frequency:
+            excess = max(excess, count // self._cull_frequency)
+        else:
+            excess = count
+        db.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY accessed LIMIT ?)',
+            (excess,)
+        )
+
+    def close(self, **kwargs):
+        # Соединения живут всё время работы потока: открывать файл
+        # заново на каждый запрос дороже, чем держать его открытым.
+        pass
+
+
+JOURNAL_KEY = 'tiered:journal'
+# Сколько записей журнала хранится в общем кэше. Если процесс отстал
+# сильнее, он просто очищает весь свой L1.
+JOURNAL_SIZE = 256
+JOURNAL_TIMEOUT = 60
+
+# L1 у каждого процесса один на все потоки: Django создаёт экземпляр
+# бэкенда на поток, поэтому состояние хранится на уровне модуля.
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class LocalTier:
+    """LRU в памяти процесса с коротким сроком жизни записей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.data = OrderedDict()
+        self.lock = threading.Lock()
+        self.seen = None
+        self.polled = 0
+        self.stats = Counter()
+
+    def get(self, key, now):
+        with self.lock:
+            item = self.data.get(key)
+            if item is None:
+                return None
+            pickled, expires = item
+            if expires <= now:
+                del self.data[key]
+                return None
+            self.data.move_to_end(key)
+            return pickled
+
+    def set(self, key, pickled, expires):
+        with self.lock:
+            self.data[key] = (pickled, expires)
+            self.data.move_to_end(key)
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+
+    def drop(self, keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.data.clear()
+
+
+class TieredCache(BaseCache):
+    """Двухуровневый кэш: LRU в памяти процесса (L1) перед общим
+    кэшем (L2, алиас из OPTIONS['SHARED']).
+
+    Запись и удаление идут в L2 и добавляют ключ в журнал в том же L2.
+    Каждый процесс читает журнал не чаще раза в POLL_INTERVAL секунд
+    и выбрасывает из L1 изменённые ключи, так что чужая запись видна
+    не позже чем через POLL_INTERVAL, а в худшем случае (гонка
+    с чтением) — через L1_TIMEOUT.
+
+        CACHES = {
+            'default': {
+                'BACKEND': 'core.cache.TieredCache',
+                'LOCATION': 'default',
+                'OPTIONS': {'SHARED': 'shared', 'MAX_ENTRIES': 1000},
+            },
+            'shared': {...},
+        }
+    """
+
+    pickle_protocol = pickle.HIGHEST_PROTOCOL
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.shared_alias = options.get('SHARED', 'shared')
+        self.l1_timeout = options.get('L1_TIMEOUT', 5)
+        self.poll_interval = options.get('POLL_INTERVAL', 0.5)
+        with _tiers_lock:
+            self.local = _tiers.setdefault(
+                location, LocalTier(self._max_entries)
+            )
+
+    @property
+    def shared(self):
+        return caches[self.shared_alias]
+
+    @property
+    def stats(self):
+        """Попадания и промахи по уровням: l1_hits, l2_misses и т. д."""
+        return dict(self.local.stats)
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _remember(self, key, value, timeout=DEFAULT_TIMEOUT, now=None):
+        now = now or time.time()
+        expires = now + self.l1_timeout
+        backend_timeout = self.get_backend_timeout(timeout)
+        if backend_timeout is not None:
+            expires = min(expires, backend_timeout)
+        self.local.set(key, pickle.dumps(value, self.pickle_protocol), expires)
+
+    def _publish(self, keys):
+        """Сообщает остальным процессам, что ключи изменились."""
+        if not keys:
+            return
+        shared = self.shared
+        try:
+            last = shared.incr(JOURNAL_KEY, len(keys))
+        except ValueError:
+            # Номер начинается со времени: если счётчик журнала
+            # вытеснили, новый не совпадёт со старыми и процессы
+            # очистят свой L1.
+            start = time.time_ns()
+            created = shared.add(JOURNAL_KEY, start, None)
+            if created and self.local.seen is None:
+                # Журнал завели мы: всё, что было до него, уже сброшено.
+                self.local.seen = start
+            last = shared.incr(JOURNAL_KEY, len(keys))
+        first = last - len(keys) + 1
+        shared.set_many(
+            {f'{JOURNAL_KEY}:{first + n}': key for n, key in enumerate(keys)},
+            JOURNAL_TIMEOUT
+        )
+        if self.local.seen == first - 1:
+            # Свои записи читать из журнала незачем.
+            self.local.seen = last
+
+    def _poll(self, now):
+        local = self.local
+        if now - local.polled < self.poll_interval:
+            return
+        local.polled = now
+        shared = self.shared
+        seq = shared.get(JOURNAL_KEY)
+        seen = local.seen
+        if seq == seen:
+            return
+        local.seen = seq
+        if seq is None or seen is None or not 0 < seq - seen <= JOURNAL_SIZE:
+            local.clear()
+            return
+        entries = shared.get_many(
+            [f'{JOURNAL_KEY}:{n}' for n in range(seen + 1, seq + 1)]
+        )
+        if len(entries) < seq - seen:
+            # Часть журнала уже вытеснена: что изменилось, неизвестно.
+            local.clear()
+        else:
+            local.drop(entries.values())
+
+    def get_many(self, keys, version=None):
+        now = time.time()
+        self._poll(now)
+        made = {self._key(key, version): key for key in keys}
+        found, missing = {}, []
+        for made_key, key in made.items():
+            pickled = self.local.get(made_key, now)
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        stats = self.local.stats
+        stats['l1_hits'] += len(found)
+        stats['l1_misses'] += len(missing)
+        if missing:
+            loaded = self.shared.get_many(missing, version=version)
+            stats['l2_hits'] += len(loaded)
+            stats['l2_misses'] += len(missing) - len(loaded)
+            for key, value in loaded.items():
+                self._remember(self._key(key, version), value, now=now)
+            found.update(loaded)
+        return found
+
+    def get(self, key, default=None, version=None):
+        return self.get_many([key], version=version).get(key, default)
+
+    def has_key(self, key, version=None):
+        return key in self.get_many([key], version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version=version)
+        made = []
+        for key, value in data.items():
+            if key not in failed:
+                made.append(self._key(key, version))
+                self._remember(made[-1], value, timeout)
+        self._publish(made)
+        return failed
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout, version=version)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        # Промахи в L1 не кэшируются, поэтому публиковать новый
+        # ключ не нужно: у других процессов его ещё нет.
+        added = self.shared.add(key, value, timeout, version=version)
+        if added:
+            self._remember(self._key(key, version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        value = self.shared.incr(key, delta, version=version)
+        made_key = self._key(key, version)
+        self._remember(made_key, value)
+        self._publish([made_key])
+        return value
+
+    def delete_many(self, keys, version=None):
+        self.shared.delete_many(keys, version=version)
+        made = [self._key(key, version) for key in keys]
+        self.local.drop(made)
+        self._publish(made)
+
+    def delete(self, key, version=None):
+        self.delete_many([key], version=version)
+
+    def clear(self):
+        # Вместе с L2 пропадает и журнал: остальные процессы увидят,
+        # что его номер сбросился, и очистят свой L1.
+        self.shared.clear()
+        self.local.clear()
+        self.local.seen = None
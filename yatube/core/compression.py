@@ -0,0 +1,142 @@
+import gzip
+import hashlib
+import re
+import zlib
+
+from django.core.cache import cache
+from django.utils.cache import cc_delim_re, get_max_age
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Меньше этого сжимать невыгодно: заголовки съедят выигрыш.
+MIN_SIZE = 200
+# Сжатые копии адресуются хешем содержимого, так что устаревать им
+# незачем; срок только освобождает место.
+COMPRESSED_TIMEOUT = 60 * 60 * 24
+COMPRESSIBLE_TYPES = re.compile(
+    r'^(text/|application/(json|javascript|xml)|image/svg\+xml)'
+)
+
+
+def gzip_compress(data):
+    # mtime=0: одинаковый вход — одинаковые байты, а значит и ETag.
+    return gzip.compress(data, compresslevel=6, mtime=0)
+
+
+def brotli_compress(data):
+    return brotli.compress(data, mode=brotli.MODE_TEXT, quality=5)
+
+
+# В порядке предпочтения при равном q.
+ENCODERS = {}
+if brotli is not None:
+    ENCODERS['br'] = brotli_compress
+ENCODERS['gzip'] = gzip_compress
+
+
+def accepted_encodings(header, available=ENCODERS):
+    """Кодировки из available, которые клиент принимает по
+    Accept-Encoding, от предпочтительной к остальным (q=0 — отказ)."""
+    weights = {}
+    for item in header.split(','):
+        name, *params = [part.strip() for part in item.split(';')]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            weights[name.lower()] = quality
+    wildcard = weights.get('*', 0.0)
+    ranked = [
+        (weights.get(name, wildcard), -order, name)
+        for order, name in enumerate(available)
+    ]
+    return [name for quality, _, name in sorted(ranked, reverse=True)
+            if quality > 0]
+
+
+def choose_encoding(header):
+    encodings = accepted_encodings(header)
+    return encodings[0] if encodings else None
+
+
+def compressed_key(encoding, data):
+    return f'compressed:{encoding}:{hashlib.md5(data).hexdigest()}'
+
+
+def mark_shared(response):
+    """Помечает ответ, байты которого повторятся у других клиентов
+    (страница из кэша): только такие сжатые копии стоит хранить."""
+    response.compress_shared = True
+    return response
+
+
+def is_shared(response):
+    """Повторятся ли байты ответа у других клиентов.
+
+    Кроме помеченных mark_shared, это ответы, которые можно держать
+    в общем кэше: их отдают cache_page, CacheMiddleware и другие
+    кэши страниц, и все они ставят положительный max-age. Ответ
+    с private или no-store — личный, сколько бы он ни хранился.
+    """
+    if getattr(response, 'compress_shared', False):
+        return True
+    directives = {
+        directive.split('=', 1)[0].strip().lower()
+        for directive in cc_delim_re.split(response.get('Cache-Control', ''))
+    }
+    if directives & {'private', 'no-store'}:
+        return False
+    return (get_max_age(response) or 0) > 0
+
+
+def compress(data, encoding, cache=cache):
+    """Сжатые байты data из кэша; при промахе сжимает и сохраняет.
+
+    Ключ — хеш содержимого, поэтому общая страница сжимается один
+    раз, пока её байты не изменятся. Для ответов, которые каждый раз
+    разные (формы с новым CSRF-токеном, личные страницы), копия
+    была бы мусором в кэше: их сжимает encode().
+    """
+    key = compressed_key(encoding, data)
+    compressed = cache.get(key)
+    if compressed is None:
+        compressed = ENCODERS[encoding](data)
+        cache.set(key, compressed, COMPRESSED_TIMEOUT)
+    return compressed
+
+
+def encode(data, encoding):
+    return ENCODERS[encoding](data)
+
+
+def stream_compressor(encoding):
+    """(сжать, сбросить, завершить) для потокового ответа."""
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return (
+            compressor.compress,
+            lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.flush,
+        )
+    compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=5)
+    return compressor.process, compressor.flush, compressor.finish
+
+
+def compress_stream(chunks, encoding):
+    """Потоковые ответы сжимаются на лету и не кэшируются. Каждый
+    кусок сбрасывается сразу, иначе начало страницы застрянет
+    в буфере компрессора."""
+    process, flush, finish = stream_compressor(encoding)
+    for chunk in chunks:
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
@@ -0,0 +1,61 @@
+import time
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+# Как часто (в инструкциях виртуальной машины SQLite) сверяться
+# с часами: реже — дешевле, чаще — точнее.
+PROGRESS_STEPS = 1000
+
+WRITE_STATEMENTS = (
+    'INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'CREATE', 'DROP', 'ALTER',
+)
+
+
+class ReadOnlyError(Exception):
+    """Запись в базу, пока сайт работает только на чтение."""
+
+
+@contextmanager
+def latency_budget(seconds, using=DEFAULT_DB_ALIAS):
+    """Ограничивает время запросов к SQLite внутри блока.
+
+    Запрос, не уложившийся в срок, прерывается, а ожидание
+    заблокированной базы длится не дольше оставшегося бюджета:
+    в обоих случаях летит OperationalError. Соединение настраивается
+    только при первом запросе, поэтому ответы из кэша ничего не платят.
+    """
+    db = connections[using]
+    if seconds is None or db.vendor != 'sqlite':
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    installed = []
+
+    def budget(execute, sql, params, many, context):
+        left = int((deadline - time.monotonic()) * 1000)
+        if left <= 0:
+            raise OperationalError('latency budget exceeded')
+        if not installed:
+            raw = db.connection
+            busy_timeout = raw.execute('PRAGMA busy_timeout').fetchone()[0]
+            installed.append((raw, busy_timeout))
+            raw.set_progress_handler(
+                lambda: time.monotonic() > deadline, PROGRESS_STEPS
+            )
+        installed[0][0].execute(f'PRAGMA busy_timeout = {left}')
+        return execute(sql, params, many, context)
+
+    with db.execute_wrapper(budget):
+        try:
+            yield
+        finally:
+            for raw, busy_timeout in installed:
+                raw.set_progress_handler(None, 0)
+                raw.execute(f'PRAGMA busy_timeout = {busy_timeout}')
+
+
+def reject_writes(execute, sql, params, many, context):
+    if sql.lstrip().upper().startswith(WRITE_STATEMENTS):
+        raise ReadOnlyError(sql)
+    return execute(sql, params, many, context)
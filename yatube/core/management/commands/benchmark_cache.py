@@ -0,0 +1,162 @@
+import multiprocessing
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from core.cache import SQLiteCache, TieredCache
+
+PAYLOAD = 'x' * 2048
+
+
+def backends(location, count):
+    # Все ключи должны поместиться, иначе сравниваем вытеснение.
+    params = {'OPTIONS': {'MAX_ENTRIES': count * 2}}
+    yield 'locmem', lambda: LocMemCache('benchmark', params)
+    yield 'sqlite', lambda: SQLiteCache(location, params)
+    # L2 — алиас 'shared', подменённый на тот же временный файл.
+    yield 'tiered', lambda: TieredCache('benchmark', params)
+
+
+def operations(cache, count):
+    keys = [f'key{i}' for i in range(count)]
+
+    def incr():
+        cache.set('counter', 0)
+        for _ in keys:
+            cache.incr('counter')
+
+    yield 'set', lambda: [cache.set(key, PAYLOAD) for key in keys]
+    yield 'get', lambda: [cache.get(key) for key in keys]
+    # Время считается на ключ, читаются пачками по 10.
+    yield 'get_many', lambda: [
+        cache.get_many(keys[i:i + 10]) for i in range(0, count, 10)
+    ]
+    yield 'incr', incr
+
+
+@contextmanager
+def counting_transactions():
+    """Считает транзакции записи SQLiteCache (BEGIN IMMEDIATE … COMMIT)
+    во всех экземплярах, в том числе в L2 у TieredCache."""
+    counter = {'transactions': 0}
+    write = SQLiteCache._write
+
+    def counted(self):
+        counter['transactions'] += 1
+        return write(self)
+
+    SQLiteCache._write = counted
+    try:
+        yield counter
+    finally:
+        SQLiteCache._write = write
+
+
+def incr_worker(make_cache, count):
+    cache = make_cache()
+    for _ in range(count):
+        cache.incr('counter')
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость SQLiteCache, TieredCache и LocMemCache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--count',
+            type=int,
+            default=5000,
+            help='Сколько операций каждого вида выполнить.'
+        )
+        parser.add_argument(
+            '--processes',
+            type=int,
+            default=4,
+            help='Сколько процессов одновременно увеличивают счётчик.'
+        )
+
+    def handle(self, *args, count, processes, **options):
+        with tempfile.TemporaryDirectory() as directory:
+            location = os.path.join(directory, 'cache.sqlite3')
+            shared = {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': location,
+                'OPTIONS': {'MAX_ENTRIES': count * 4},
+            }
+            with override_settings(
+                CACHES={**settings.CACHES, 'shared': shared}
+            ):
+                writes = {}
+                for name, make_cache in backends(location, count):
+                    writes[name] = self.sequential(name, make_cache(), count)
+                    self.concurrent(name, make_cache, count, processes)
+                self.write_cost(writes)
+
+    def sequential(self, name, cache, count):
+        """Печатает скорость операций; возвращает (мкс, транзакций
+        SQLite) на один set."""
+        # Первое чтение TieredCache сверяется с журналом и очищает L1.
+        cache.get('warmup')
+        write = None
+        for operation, run in operations(cache, count):
+            with counting_transactions() as counter:
+                started = time.perf_counter()
+                run()
+                elapsed = time.perf_counter() - started
+            if operation == 'set':
+                write = (
+                    elapsed / count * 1e6, counter['transactions'] / count
+                )
+            self.stdout.write(
+                f'{name:8}{operation:10}'
+                f'{count / elapsed:12.0f} оп/с'
+                f'{elapsed / count * 1e6:10.1f} мкс/оп'
+            )
+        if isinstance(cache, TieredCache):
+            self.stdout.write(f'{name:8}{"stats":10}  {cache.stats}')
+        return write
+
+    def write_cost(self, writes):
+        # Запись в TieredCache — это запись в L2 плюс журнал: номер
+        # (incr) и ключ под этим номером, каждый своей транзакцией.
+        base, _ = writes['sqlite']
+        for name in ('sqlite', 'tiered'):
+            micros, transactions = writes[name]
+            self.stdout.write(
+                f'{name:8}{"set":10}{micros:12.1f} мкс'
+                f'{micros / base:8.1f}× sqlite'
+                f'{transactions:8.1f} транзакций SQLite на запись'
+            )
+
+    def concurrent(self, name, make_cache, count, processes):
+        context = multiprocessing.get_context('fork')
+        per_worker = count // processes
+        make_cache().set('counter', 0)
+        workers = [
+            context.Process(target=incr_worker, args=(make_cache, per_worker))
+            for _ in range(processes)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+        # У locmem в каждом процессе свой счётчик: воркеры его не видят.
+        # TieredCache читаем из L2: в L1 родителя может остаться 0.
+        reader = make_cache()
+        if isinstance(reader, TieredCache):
+            reader = caches[reader.shared_alias]
+        total = reader.get('counter')
+        self.stdout.write(
+            f'{name:8}{"incr×" + str(processes):10}'
+            f'{per_worker * processes / elapsed:12.0f} оп/с'
+            f'   счётчик в родителе: {total}'
+        )
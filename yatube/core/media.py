@@ -0,0 +1,154 @@
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import (
+    FileResponse, Http404, HttpResponse, HttpResponseNotModified,
+    StreamingHttpResponse
+)
+from django.utils.http import http_date, parse_etags, quote_etag
+from django.views.decorators.http import require_safe
+
+# Имя с хешем (миниатюры sorl: cache/ab/cd/<md5>.jpg) под тем же
+# адресом не меняется, его можно кэшировать навсегда.
+HASHED_NAME = re.compile(r'(^|[^0-9a-f])[0-9a-f]{12,}(\.[^/]*)?$')
+IMMUTABLE = 'public, max-age=31536000, immutable'
+MUTABLE = 'public, max-age=3600'
+RANGE = re.compile(r'^bytes=(\d*)-(\d*)$')
+CHUNK_SIZE = 64 * 1024
+
+
+class RangeNotSatisfiable(ValueError):
+    """Запрошенный диапазон целиком за концом файла."""
+
+
+def media_path(path):
+    """Абсолютный путь файла в MEDIA_ROOT или None, если файла нет
+    или адрес ведёт за пределы MEDIA_ROOT либо к скрытому файлу."""
+    if any(part.startswith('.') for part in path.split('/')):
+        return None
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    full_path = os.path.realpath(os.path.join(root, path))
+    if not full_path.startswith(root + os.sep):
+        return None
+    if not os.path.isfile(full_path):
+        return None
+    return full_path
+
+
+def parse_range(header, size):
+    """(начало, конец) включительно для одного диапазона Range или
+    None, если заголовок не понят (тогда отдаётся весь файл)."""
+    match = RANGE.match(header.strip())
+    if match is None or match.groups() == ('', ''):
+        return None
+    start, end = match.groups()
+    if start:
+        start = int(start)
+        end = min(int(end), size - 1) if end else size - 1
+        if start > end:
+            raise RangeNotSatisfiable(header)
+    else:
+        length = int(end)
+        if length == 0 or size == 0:
+            raise RangeNotSatisfiable(header)
+        start, end = max(size - length, 0), size - 1
+    return start, end
+
+
+def read_range(file, start, end):
+    with file:
+        file.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def accel_response(path, full_path):
+    """Отдачу файла берёт на себя фронт (MEDIA_ACCEL): Django только
+    проверяет доступ и ставит заголовки."""
+    response = HttpResponse()
+    # Заголовки — только ASCII: иначе Django закодирует их по RFC 2047,
+    # и фронт файла не найдёт. nginx и mod_xsendfile раскодируют %XX.
+    if settings.MEDIA_ACCEL == 'nginx':
+        response['X-Accel-Redirect'] = quote(
+            settings.MEDIA_ACCEL_PREFIX + path
+        )
+    else:
+        response['X-Sendfile'] = quote(full_path)
+    # Тип и длину выставит фронт по самому файлу.
+    del response['Content-Type']
+    return response
+
+
+def file_response(request, full_path, size, etag):
+    content_type, encoding = mimetypes.guess_type(full_path)
+    content_type = content_type or 'application/octet-stream'
+    header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if header and if_range not in (None, etag):
+        header = None
+    try:
+        byte_range = parse_range(header, size) if header else None
+    except RangeNotSatisfiable:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    if byte_range is None:
+        response = FileResponse(
+            open(full_path, 'rb'), content_type=content_type
+        )
+    else:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            read_range(open(full_path, 'rb'), start, end),
+            status=206,
+            content_type=content_type,
+        )
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+        response['Content-Length'] = str(end - start + 1)
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+
+@require_safe
+def serve(request, path):
+    """Файлы из MEDIA_ROOT без django.views.static.
+
+    При MEDIA_ACCEL ('nginx' или 'sendfile') байты отдаёт фронт по
+    X-Accel-Redirect / X-Sendfile, иначе весь файл уходит через
+    FileResponse (wsgi.file_wrapper, sendfile), а Range — кусками.
+    Поддерживаются Range, If-Range и If-None-Match.
+    """
+    full_path = media_path(path)
+    if full_path is None:
+        raise Http404('Файл не найден')
+    cache_control = IMMUTABLE if HASHED_NAME.search(path) else MUTABLE
+    return respond(request, path, full_path, cache_control)
+
+
+def respond(request, path, full_path, cache_control):
+    """Ответ с файлом full_path (path — его имя внутри MEDIA_ROOT)."""
+    stat = os.stat(full_path)
+    etag = quote_etag(hashlib.md5(
+        f'{path}:{stat.st_size}:{stat.st_mtime_ns}'.encode()
+    ).hexdigest())
+    if etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        response = HttpResponseNotModified()
+    elif getattr(settings, 'MEDIA_ACCEL', None):
+        response = accel_response(path, full_path)
+    else:
+        response = file_response(request, full_path, stat.st_size, etag)
+    response['ETag'] = etag
+    response['Cache-Control'] = cache_control
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    return response
@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+
+from .compression import (
+    COMPRESSIBLE_TYPES, MIN_SIZE, choose_encoding, compress, compress_stream,
+    encode, is_shared
+)
+from .database import ReadOnlyError, reject_writes
+from .views import read_only
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class ReadOnlyMiddleware:
+    """При READ_ONLY = True отклоняет всё, что пишет в базу: формы
+    сразу, а запись из GET-запросов (подписки и т. п.) — на уровне
+    SQL. Чтение работает как обычно."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not getattr(settings, 'READ_ONLY', False):
+            return self.get_response(request)
+        if request.method not in SAFE_METHODS:
+            return read_only(request)
+        with connections['default'].execute_wrapper(reject_writes):
+            return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, ReadOnlyError):
+            return read_only(request)
+        return None
+
+
+class CompressionMiddleware:
+    """Сжимает ответы в br или gzip по Accept-Encoding.
+
+    Сжатые копии общих страниц (помеченных core.compression.mark_shared
+    или отданных кэшем страниц, см. is_shared) хранятся в кэше рядом
+    с ними, поэтому такая страница сжимается один раз. Остальные
+    ответы, в том числе потоковые, сжимаются на лету.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (response.has_header('Content-Encoding')
+                or response.has_header('Content-Range')):
+            return response
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if response.status_code == 304:
+            if encoding is not None:
+                self.weaken_etag(response)
+            return response
+        if not COMPRESSIBLE_TYPES.match(response.get('Content-Type', '')):
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if encoding is None:
+            return response
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content, encoding
+            )
+            del response['Content-Length']
+        else:
+            if len(response.content) < MIN_SIZE:
+                return response
+            if is_shared(response):
+                compressed = compress(response.content, encoding)
+            else:
+                compressed = encode(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        self.weaken_etag(response)
+        response['Content-Encoding'] = encoding
+        return response
+
+    @staticmethod
+    def weaken_etag(response):
+        # Сжатые байты другие: сильный ETag несжатой версии им не
+        # подходит, а слабый сравнивают так же, как и раньше.
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
@@ -0,0 +1,120 @@
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import Http404
+from django.urls import reverse
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.views.decorators.http import require_safe
+from PIL import Image, ImageOps
+
+from .media import IMMUTABLE, media_path, respond
+from .stampede import LOCK_TIMEOUT, WAIT_STEP, lock_key
+
+# Варианты лежат в MEDIA_ROOT по тому же пути, что и их адрес, так
+# что фронт может отдавать готовые сам, а в Django идут только
+# промахи.
+VARIANTS_DIR = 'r'
+# Как вписывать картинку в размер: fit — целиком, без обрезки и
+# увеличения, остальные — заполнить размер, обрезав лишнее.
+CROPS = {
+    'fit': None,
+    'center': (0.5, 0.5),
+    'top': (0.5, 0.0),
+    'bottom': (0.5, 1.0),
+}
+MAX_SIDE = 4000
+JPEG_QUALITY = 85
+SALT = 'core.resize'
+
+
+def variant_name(width, height, crop, path):
+    return f'{VARIANTS_DIR}/{width}x{height}/{crop}/{path}'
+
+
+def signature(width, height, crop, path):
+    return salted_hmac(
+        SALT, variant_name(width, height, crop, path)
+    ).hexdigest()[:20]
+
+
+def resized_url(path, width, height, crop='center'):
+    """Подписанный адрес варианта картинки path (имя в MEDIA_ROOT)."""
+    url = reverse('resize', kwargs={
+        'width': width, 'height': height, 'crop': crop, 'path': path,
+    })
+    return f'{url}?sig={signature(width, height, crop, path)}'
+
+
+def resize(source, target, width, height, crop):
+    with Image.open(source) as image:
+        image_format = image.format
+        image = ImageOps.exif_transpose(image)
+        if CROPS[crop] is None:
+            image.thumbnail((width, height), Image.LANCZOS)
+        else:
+            image = ImageOps.fit(
+                image, (width, height), Image.LANCZOS,
+                centering=CROPS[crop],
+            )
+        options = {}
+        if image_format == 'JPEG':
+            image = image.convert('RGB')
+            options = {'quality': JPEG_QUALITY, 'optimize': True}
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Файл появляется под своим именем только целиком.
+        handle, temporary = tempfile.mkstemp(dir=os.path.dirname(target))
+        try:
+            with os.fdopen(handle, 'wb') as output:
+                image.save(output, image_format, **options)
+            os.replace(temporary, target)
+        except BaseException:
+            os.unlink(temporary)
+            raise
+
+
+def ensure_variant(source, target, width, height, crop):
+    """Создаёт вариант один раз, сколько бы запросов ни пришло
+    одновременно: создаёт тот, кто взял блокировку в кэше (её видят
+    все процессы). Остальные ждут, пока её держат, — сколько бы ни
+    шёл ресайз большой картинки, — а затем находят готовый файл или,
+    если создать его не вышло, пробуют сами. Брошенная блокировка
+    истекает через LOCK_TIMEOUT."""
+    key = lock_key(f'resize:{target}')
+    while not os.path.exists(target):
+        if cache.add(key, 1, LOCK_TIMEOUT):
+            try:
+                if not os.path.exists(target):
+                    resize(source, target, width, height, crop)
+            finally:
+                cache.delete(key)
+            return
+        time.sleep(WAIT_STEP)
+
+
+@require_safe
+def serve(request, width, height, crop, path):
+    """/media/r/<w>x<h>/<crop>/<path>?sig=…: вариант картинки нужного
+    размера. Адрес подписан (resized_url), поэтому новые размеры для
+    вёрстки не требуют отдельного прохода по картинкам, а чужие
+    размеры никто не закажет. Готовый вариант не меняется и
+    кэшируется навсегда."""
+    expected = signature(width, height, crop, path)
+    if not constant_time_compare(request.GET.get('sig', ''), expected):
+        raise Http404('Неверная подпись')
+    if (crop not in CROPS or not 0 < width <= MAX_SIDE
+            or not 0 < height <= MAX_SIDE
+            or path.startswith(VARIANTS_DIR + '/')):
+        raise Http404('Такого варианта нет')
+    source = media_path(path)
+    if source is None:
+        raise Http404('Файл не найден')
+    name = variant_name(width, height, crop, path)
+    target = os.path.join(os.path.realpath(settings.MEDIA_ROOT), name)
+    try:
+        ensure_variant(source, target, width, height, crop)
+    except (OSError, Image.DecompressionBombError):
+        raise Http404('Не картинка')
+    return respond(request, name, target, IMMUTABLE)
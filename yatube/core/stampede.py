@@ -0,0 +1,76 @@
+import math
+import random
+import time
+from collections import namedtuple
+
+from django.core.cache import cache as default_cache
+
+# Сколько ждать, пока значение пересчитает другой запрос, и как часто
+# проверять, не появилось ли оно.
+WAIT_TIMEOUT = 2
+WAIT_STEP = 0.05
+# Блокировка пересчёта снимается сама, если вычисляющий процесс упал.
+LOCK_TIMEOUT = 30
+# Коэффициент раннего обновления (XFetch): больше — раньше.
+BETA = 1.0
+
+Entry = namedtuple('Entry', 'value delta expires')
+
+
+def lock_key(key):
+    return f'{key}:lock'
+
+
+def refresh_due(entry, now, beta=BETA):
+    """XFetch: чем ближе срок и чем дольше считается значение, тем
+    вероятнее запрос обновит его заранее, пока остальные читают
+    старое. Так записи не истекают у всех одновременно."""
+    if entry.expires is None:
+        return False
+    jitter = -entry.delta * beta * math.log(1 - random.random())
+    return now + jitter >= entry.expires
+
+
+def get_or_compute(key, compute, timeout, cache=None, keep=None):
+    """Значение из кэша или compute(), но считает его один запрос.
+
+    Запись хранится вдвое дольше timeout: после мягкого срока один
+    запрос (взявший блокировку) пересчитывает значение, остальные
+    получают прежнее. Если прежнего нет, остальные ждут до
+    WAIT_TIMEOUT, а затем считают сами. keep(value) решает, стоит ли
+    сохранять результат (например, только ответы 200).
+    """
+    cache = cache or default_cache
+    entry = cache.get(key)
+    if not isinstance(entry, Entry):
+        entry = None
+    if entry is not None and not refresh_due(entry, time.time()):
+        return entry.value
+    if cache.add(lock_key(key), 1, LOCK_TIMEOUT):
+        try:
+            return _compute(key, compute, timeout, cache, keep)
+        finally:
+            cache.delete(lock_key(key))
+    if entry is not None:
+        return entry.value
+    deadline = time.monotonic() + WAIT_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(WAIT_STEP)
+        entry = cache.get(key)
+        if isinstance(entry, Entry):
+            return entry.value
+    return _compute(key, compute, timeout, cache, keep)
+
+
+def _compute(key, compute, timeout, cache, keep):
+    started = time.time()
+    value = compute()
+    now = time.time()
+    if keep is None or keep(value):
+        expires = None if timeout is None else now + timeout
+        cache.set(
+            key,
+            Entry(value, now - started, expires),
+            None if timeout is None else timeout * 2
+        )
+    return value
@@ -0,0 +1,155 @@
+import hashlib
+import mimetypes
+import os
+from collections import namedtuple
+from urllib.parse import urlparse
+from wsgiref.util import FileWrapper
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.http import http_date, parse_etags
+
+from .compression import (
+    COMPRESSIBLE_TYPES, ENCODERS, MIN_SIZE, accepted_encodings
+)
+
+# Имена с хешем содержимого не меняются: их можно кэшировать навсегда.
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Остальные (например, favicon.ico по старому адресу) — ненадолго.
+MUTABLE = 'public, max-age=60'
+EXTENSIONS = {'br': '.br', 'gzip': '.gz'}
+
+Asset = namedtuple('Asset', 'path headers encodings')
+
+
+def content_type(name):
+    guessed, _ = mimetypes.guess_type(name)
+    return guessed or 'application/octet-stream'
+
+
+class CompressedManifestStorage(ManifestStaticFilesStorage):
+    """collectstatic: имена с хешем содержимого (staticfiles.json)
+    и сжатые копии .gz и .br (br — если установлен brotli) рядом
+    с каждым текстовым файлом."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        names = set(paths) | set(self.hashed_files.values())
+        for name in sorted(names):
+            self.compress(name)
+
+    def compress(self, name):
+        if not COMPRESSIBLE_TYPES.match(content_type(name)):
+            return
+        with self.open(name) as original:
+            data = original.read()
+        if len(data) < MIN_SIZE:
+            return
+        for encoding, encode in ENCODERS.items():
+            compressed = encode(data)
+            if len(compressed) >= len(data):
+                continue
+            path = name + EXTENSIONS[encoding]
+            if self.exists(path):
+                self.delete(path)
+            self._save(path, ContentFile(compressed))
+
+    def stored_name(self, name):
+        try:
+            return super().stored_name(name)
+        except ValueError:
+            # collectstatic ещё не запускали (разработка, тесты):
+            # файл отдаётся по исходному имени.
+            return name
+
+
+class StaticFiles:
+    """WSGI-обёртка: отдаёт собранную статику из STATIC_ROOT, не
+    доходя до Django (ни middleware, ни URL-роутинга).
+
+    Файлы читаются один раз при старте. Клиенту, принимающему br или
+    gzip, уходит заранее сжатая копия; имена с хешем отдаются с
+    immutable. Остальные адреса, в том числе неизвестные файлы под
+    STATIC_URL, передаются приложению.
+    """
+
+    def __init__(self, application, root=None, prefix=None):
+        self.application = application
+        self.root = root or settings.STATIC_ROOT
+        self.prefix = urlparse(prefix or settings.STATIC_URL).path
+        self.files = self.scan() if self.root else {}
+
+    def scan(self):
+        if not os.path.isdir(self.root):
+            return {}
+        storage = CompressedManifestStorage(location=self.root)
+        immutable = set(storage.load_manifest().values())
+        files = {}
+        for directory, _, names in os.walk(self.root):
+            for filename in names:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if (name.endswith(tuple(EXTENSIONS.values()))
+                        or name == storage.manifest_name):
+                    continue
+                files[name] = self.asset(path, name in immutable)
+        return files
+
+    @staticmethod
+    def asset(path, immutable):
+        stat = os.stat(path)
+        version = f'{stat.st_size}:{stat.st_mtime_ns}'
+        headers = {
+            'Content-Type': content_type(path),
+            'Cache-Control': IMMUTABLE if immutable else MUTABLE,
+            'Last-Modified': http_date(stat.st_mtime),
+            'ETag': '"%s"' % hashlib.md5(version.encode()).hexdigest(),
+        }
+        encodings = {
+            encoding: path + extension
+            for encoding, extension in EXTENSIONS.items()
+            if os.path.isfile(path + extension)
+        }
+        if encodings:
+            headers['Vary'] = 'Accept-Encoding'
+        return Asset(path, headers, encodings)
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        asset = None
+        if path.startswith(self.prefix):
+            asset = self.files.get(path[len(self.prefix):])
+        if asset is None:
+            return self.application(environ, start_response)
+        method = environ['REQUEST_METHOD']
+        if method not in ('GET', 'HEAD'):
+            start_response('405 Method Not Allowed', [
+                ('Allow', 'GET, HEAD'), ('Content-Length', '0'),
+            ])
+            return []
+        headers = dict(asset.headers)
+        file_path = asset.path
+        accepted = accepted_encodings(
+            environ.get('HTTP_ACCEPT_ENCODING', ''), asset.encodings
+        )
+        if accepted:
+            encoding = accepted[0]
+            file_path = asset.encodings[encoding]
+            headers['Content-Encoding'] = encoding
+            # У каждой кодировки свои байты, значит и свой ETag.
+            headers['ETag'] = headers['ETag'][:-1] + f'-{encoding}"'
+        etags = parse_etags(environ.get('HTTP_IF_NONE_MATCH', ''))
+        if headers['ETag'] in etags or '*' in etags:
+            headers.pop('Content-Type')
+            headers.pop('Content-Encoding', None)
+            start_response('304 Not Modified', list(headers.items()))
+            return []
+        headers['Content-Length'] = str(os.path.getsize(file_path))
+        start_response('200 OK', list(headers.items()))
+        if method == 'HEAD':
+            return []
+        file_wrapper = environ.get('wsgi.file_wrapper', FileWrapper)
+        return file_wrapper(open(file_path, 'rb'))
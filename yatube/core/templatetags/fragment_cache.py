@@ -0,0 +1,54 @@
+from django import template
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.utils import make_template_fragment_key
+from django.templatetags.cache import CacheNode, do_cache
+
+from ..stampede import get_or_compute
+
+register = template.Library()
+
+
+class SingleFlightCacheNode(CacheNode):
+    """Как {% cache %}, но истёкший фрагмент пересчитывает один
+    запрос, а свежий иногда обновляется заранее (core.stampede)."""
+
+    def render(self, context):
+        try:
+            expire_time = self.expire_time_var.resolve(context)
+            cache_name = self.cache_name and self.cache_name.resolve(context)
+        except template.VariableDoesNotExist as error:
+            raise template.TemplateSyntaxError(
+                f'"cache" tag got an unknown variable: {error}'
+            )
+        if expire_time is not None:
+            try:
+                expire_time = int(expire_time)
+            except (ValueError, TypeError):
+                raise template.TemplateSyntaxError(
+                    f'"cache" tag got a non-integer timeout value: '
+                    f'{expire_time!r}'
+                )
+        try:
+            fragment_cache = caches[cache_name or 'default']
+        except InvalidCacheBackendError:
+            raise template.TemplateSyntaxError(
+                f'Invalid cache name specified for cache tag: {cache_name!r}'
+            )
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        return get_or_compute(
+            make_template_fragment_key(self.fragment_name, vary_on),
+            lambda: self.nodelist.render(context),
+            expire_time,
+            cache=fragment_cache,
+        )
+
+
+@register.tag('cache')
+def do_single_flight_cache(parser, token):
+    """{% load fragment_cache %} и дальше {% cache %} с тем же
+    синтаксисом, что у встроенного тега."""
+    node = do_cache(parser, token)
+    return SingleFlightCacheNode(
+        node.nodelist, node.expire_time_var, node.fragment_name,
+        node.vary_on, node.cache_name,
+    )
@@ -0,0 +1,17 @@
+from django import template
+
+from ..resize import resized_url
+
+register = template.Library()
+
+
+@register.simple_tag
+def resized(image, geometry, crop='center'):
+    """{% resized post.image "960x339" "center" %}: подписанный адрес
+    варианта картинки; создаётся при первом запросе."""
+    if not image:
+        return ''
+    width, _, height = geometry.partition('x')
+    return resized_url(
+        getattr(image, 'name', image), int(width), int(height), crop
+    )
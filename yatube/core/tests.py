@@ -1,4 +1,46 @@
-from django.test import TestCase
+import gzip
+import io
+import multiprocessing
+import os
+import shutil
+import tempfile
+import threading
+import time
+from unittest import mock, skipUnless
+
+import brotli
+from django.contrib.auth import get_user_model
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.cache import cache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.management import call_command
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    RequestFactory, SimpleTestCase, TestCase, TransactionTestCase,
+    override_settings
+)
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
+from django.utils.html import escape
+from django.views.decorators.cache import cache_page
+from PIL import Image
+
+from posts.models import Follow, Post
+
+from . import compression, middleware, resize
+from .cache import (
+    CULL_EVERY, JOURNAL_KEY, JOURNAL_SIZE, SQLiteCache, TieredCache
+)
+from .database import latency_budget
+from .media import IMMUTABLE as MEDIA_IMMUTABLE, MUTABLE as MEDIA_MUTABLE
+from .middleware import CompressionMiddleware
+from .resize import resized_url
+from .static import IMMUTABLE, MUTABLE, StaticFiles
+from .stampede import Entry, get_or_compute, lock_key, refresh_due
+
+User = get_user_model()
 
 
 class ViewTestClass(TestCase):
@@ -6,3 +48,730 @@ class ViewTestClass(TestCase):
         response = self.client.get('/nonexist-page/')
         self.assertEqual(response.status_code, 404)
         self.assertTemplateUsed(response, 'core/404.html')
+
+
+class LatencyBudgetTests(TestCase):
+    SLOW_QUERY = (
+        'WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n '
+        'LIMIT 100000000) SELECT count(*) FROM n'
+    )
+
+    def busy_timeout(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            return cursor.fetchone()[0]
+
+    @skipUnless(connection.vendor == 'sqlite', 'progress handler SQLite')
+    def test_slow_query_is_interrupted(self):
+        busy_timeout = self.busy_timeout()
+        started = time.monotonic()
+        with self.assertRaises(OperationalError):
+            with latency_budget(0.05):
+                with connection.cursor() as cursor:
+                    cursor.execute(self.SLOW_QUERY)
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.busy_timeout(), busy_timeout)
+
+
+@override_settings(READ_ONLY=True)
+class ReadOnlyTests(TransactionTestCase):
+    # Отклонённая запись ломает транзакцию, в которую TestCase
+    # заворачивает тест, поэтому здесь настоящие коммиты.
+    def setUp(self):
+        User.objects.create_user(username='Nameless')
+        self.client.force_login(User.objects.create_user(username='Fololo'))
+
+    def test_reads_work(self):
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Nameless'})
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_forms_are_rejected(self):
+        response = self.client.post(
+            reverse('posts:post_create'), {'text': 'Текст'}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertTemplateUsed(response, 'core/503.html')
+        self.assertFalse(Post.objects.exists())
+
+    def test_writes_from_get_are_rejected(self):
+        response = self.client.get(
+            reverse('posts:profile_follow', kwargs={'username': 'Nameless'})
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertFalse(Follow.objects.exists())
+
+
+def make_cache(location, **options):
+    return SQLiteCache(location, {'OPTIONS': options})
+
+
+def incr_many(location, times):
+    cache = make_cache(location)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.location = os.path.join(directory.name, 'cache.sqlite3')
+        self.cache = make_cache(self.location)
+
+    def test_set_get_delete(self):
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.assertTrue(self.cache.has_key('key'))
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+        self.assertEqual(self.cache.get('key', 'default'), 'default')
+
+    def test_many(self):
+        self.cache.set_many({'a': 1, 'b': 2})
+        self.assertEqual(
+            self.cache.get_many(['a', 'b', 'c']), {'a': 1, 'b': 2}
+        )
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+    def test_expiry(self):
+        self.cache.set('short', 1, timeout=0.05)
+        self.cache.set('forever', 1, timeout=None)
+        time.sleep(0.1)
+        self.assertIsNone(self.cache.get('short'))
+        self.assertFalse(self.cache.has_key('short'))
+        self.assertEqual(self.cache.get('forever'), 1)
+        self.assertTrue(self.cache.add('short', 2))
+        self.assertFalse(self.cache.touch('missing'))
+
+    def test_add_keeps_existing_value(self):
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_incr(self):
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter'), 11)
+        self.assertEqual(self.cache.decr('counter', 5), 6)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_workers_share_data(self):
+        other = make_cache(self.location)
+        self.cache.set('key', 'value')
+        self.assertEqual(other.get('key'), 'value')
+        other.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_incr_is_atomic_across_processes(self):
+        self.cache.set('counter', 0)
+        context = multiprocessing.get_context('fork')
+        workers = [
+            context.Process(target=incr_many, args=(self.location, 50))
+            for _ in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_incr_is_atomic_across_threads(self):
+        self.cache.set('counter', 0)
+
+        def incr():
+            for _ in range(50):
+                self.cache.incr('counter')
+
+        threads = [threading.Thread(target=incr) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_size_is_bounded_and_recent_keys_survive(self):
+        cache = make_cache(self.location, MAX_ENTRIES=20, CULL_FREQUENCY=2)
+        cache.set('hot', 'value')
+        for i in range(100):
+            cache.set(f'key{i}', i)
+            # Ключ читают чаще остальных: его не должно вытеснить.
+            cache._db.execute(
+                'UPDATE cache SET accessed = ? WHERE key = ?',
+                (time.time() + 1, cache.make_key('hot'))
+            )
+        count = cache._db.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        self.assertLessEqual(count, 20 + CULL_EVERY)
+        self.assertEqual(cache.get('hot'), 'value')
+        self.assertEqual(cache.get('key99'), 99)
+
+
+class TieredCacheTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND': 'core.cache.SQLiteCache',
+                'LOCATION': os.path.join(directory.name, 'cache.sqlite3'),
+                'OPTIONS': {'MAX_ENTRIES': 10000},
+            },
+        })
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # Два экземпляра с разными L1 ведут себя как два воркера.
+        self.first = self.make_tier('first')
+        self.second = self.make_tier('second')
+
+    def make_tier(self, name, **options):
+        options = {'POLL_INTERVAL': 0, **options}
+        return TieredCache(f'{self.id()}.{name}', {'OPTIONS': options})
+
+    def test_reads_fill_l1_and_count_hits(self):
+        self.first.set('key', 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertEqual(self.second.get('key'), 'value')
+        self.assertIsNone(self.second.get('missing'))
+        self.assertEqual(self.second.stats, {
+            'l1_hits': 1, 'l1_misses': 2, 'l2_hits': 1, 'l2_misses': 1,
+        })
+
+    def test_writes_reach_other_workers(self):
+        self.first.set('key', 1)
+        self.second.get('key')
+        self.first.set('key', 2)
+        self.assertEqual(self.second.get('key'), 2)
+        self.first.incr('key')
+        self.assertEqual(self.second.get('key'), 3)
+        self.first.delete('key')
+        self.assertIsNone(self.second.get('key'))
+
+    def test_stale_l1_is_bounded_by_poll_interval(self):
+        lazy = self.make_tier('lazy', POLL_INTERVAL=60)
+        self.first.set('key', 1)
+        lazy.get('key')
+        self.first.set('key', 2)
+        self.assertEqual(lazy.get('key'), 1)
+        lazy.local.polled = 0
+        self.assertEqual(lazy.get('key'), 2)
+
+    def test_lagging_worker_drops_whole_l1(self):
+        self.first.set('key', 1)
+        self.second.get('key')
+        for i in range(JOURNAL_SIZE + 1):
+            self.first.set(f'other{i}', i)
+        self.first.shared.set('key', 2)
+        self.assertEqual(self.second.get('key'), 2)
+
+    def test_evicted_journal_drops_whole_l1(self):
+        self.first.set('key', 1)
+        self.second.get('key')
+        self.first.shared.delete(JOURNAL_KEY)
+        self.first.shared.set('key', 2)
+        self.first.set('other', 1)
+        self.assertEqual(self.second.get('key'), 2)
+
+    def test_clear_reaches_other_workers(self):
+        self.first.set('key', 1)
+        self.second.get('key')
+        self.first.clear()
+        self.assertIsNone(self.second.get('key'))
+
+    def test_l1_is_bounded(self):
+        tier = self.make_tier('small', MAX_ENTRIES=2)
+        tier.set_many({'a': 1, 'b': 2, 'c': 3})
+        self.assertEqual(len(tier.local.data), 2)
+        self.assertEqual(tier.get('a'), 1)
+
+
+class StampedeTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = LocMemCache(self.id(), {})
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def compute(self):
+        with self.lock:
+            self.calls += 1
+        time.sleep(0.2)
+        return 'value'
+
+    def test_one_request_computes_missing_value(self):
+        results = []
+
+        def request():
+            results.append(get_or_compute(
+                'key', self.compute, 60, cache=self.cache
+            ))
+
+        threads = [threading.Thread(target=request) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(results, ['value'] * 8)
+
+    def test_stale_value_while_another_request_refreshes(self):
+        self.cache.set('key', Entry('stale', 0.1, time.time() - 1))
+        self.cache.add(lock_key('key'), 1)
+        value = get_or_compute('key', self.compute, 60, cache=self.cache)
+        self.assertEqual(value, 'stale')
+        self.assertEqual(self.calls, 0)
+
+    def test_expired_value_is_refreshed(self):
+        self.cache.set('key', Entry('stale', 0.1, time.time() - 1))
+        value = get_or_compute('key', self.compute, 60, cache=self.cache)
+        self.assertEqual(value, 'value')
+        self.assertEqual(self.cache.get('key').value, 'value')
+
+    def test_early_refresh_probability_grows_near_expiry(self):
+        now = time.time()
+        self.assertFalse(refresh_due(Entry('v', 0.01, now + 3600), now))
+        self.assertTrue(refresh_due(Entry('v', 0.01, now), now))
+        self.assertFalse(refresh_due(Entry('v', 0.01, None), now))
+        near = sum(
+            refresh_due(Entry('v', 1, now + 1), now) for _ in range(1000)
+        )
+        self.assertTrue(200 < near < 500)
+
+    def test_keep_skips_storing(self):
+        get_or_compute(
+            'key', self.compute, 60, cache=self.cache, keep=lambda v: False
+        )
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_fragment_cache_tag(self):
+        template = Template(
+            '{% load fragment_cache %}'
+            '{% cache 60 fragment name %}{{ counter.next }}{% endcache %}'
+        )
+
+        class Counter:
+            value = 0
+
+            def next(self):
+                self.value += 1
+                return self.value
+
+        counter = Counter()
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': self.id(),
+        }}):
+            first = template.render(Context({'counter': counter, 'name': 1}))
+            second = template.render(Context({'counter': counter, 'name': 1}))
+            other = template.render(Context({'counter': counter, 'name': 2}))
+        self.assertEqual((first, second, other), ('1', '1', '2'))
+
+
+class CompressionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        Post.objects.create(
+            text='Сжимаемый текст ' * 50,
+            author=User.objects.create_user(username='Nameless'),
+        )
+
+    def test_accept_encoding_negotiation(self):
+        choose = compression.choose_encoding
+        self.assertEqual(choose('gzip, deflate'), 'gzip')
+        self.assertIsNone(choose('identity'))
+        self.assertIsNone(choose('gzip;q=0'))
+        self.assertIsNone(choose(''))
+        self.assertEqual(choose('*'), next(iter(compression.ENCODERS)))
+
+    def test_cached_page_is_compressed_once(self):
+        url = reverse('posts:index')
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        calls = []
+        gzip_compress = compression.ENCODERS['gzip']
+
+        def counting(data):
+            calls.append(data)
+            return gzip_compress(data)
+
+        with mock.patch.dict(compression.ENCODERS, {'gzip': counting}):
+            for _ in range(2):
+                response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertTrue(response['ETag'].startswith('W/"'))
+                self.assertEqual(
+                    gzip.decompress(response.content), plain.content
+                )
+        self.assertEqual(len(calls), 1)
+
+    def test_brotli_preferred_and_streamed(self):
+        self.assertEqual(
+            compression.choose_encoding('gzip, deflate, br'), 'br'
+        )
+        url = reverse('posts:index')
+        plain = self.client.get(url)
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain.content)
+
+        self.client.force_login(User.objects.get(username='Nameless'))
+        response = self.client.get(
+            reverse('posts:follow_index'), HTTP_ACCEPT_ENCODING='br'
+        )
+        self.assertEqual(response['Content-Encoding'], 'br')
+        content = brotli.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'</html>', content)
+
+    def test_personal_page_is_not_stored(self):
+        self.client.force_login(User.objects.get(username='Nameless'))
+        with mock.patch.object(middleware, 'compress') as compress:
+            response = self.client.get(
+                reverse('posts:post_create'), HTTP_ACCEPT_ENCODING='gzip'
+            )
+        compress.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(response.content)
+        self.assertIn(b'csrfmiddlewaretoken', content)
+
+    def test_view_cache_responses_are_shared(self):
+        @cache_page(60)
+        def page(request):
+            return HttpResponse('Общая страница ' * 50)
+
+        calls = []
+        gzip_compress = compression.ENCODERS['gzip']
+
+        def counting(data):
+            calls.append(data)
+            return gzip_compress(data)
+
+        handler = CompressionMiddleware(page)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        with mock.patch.dict(compression.ENCODERS, {'gzip': counting}):
+            for _ in range(2):
+                response = handler(request)
+                self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(len(calls), 1)
+
+        self.assertFalse(compression.is_shared(HttpResponse()))
+        private = HttpResponse()
+        patch_cache_control(private, private=True, max_age=60)
+        self.assertFalse(compression.is_shared(private))
+
+    def test_weak_etag_gets_not_modified(self):
+        url = reverse('posts:index')
+        etag = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get(
+            url, HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_streaming_response_is_compressed(self):
+        self.client.force_login(User.objects.get(username='Nameless'))
+        response = self.client.get(
+            reverse('posts:follow_index'), HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        content = gzip.decompress(b''.join(response.streaming_content))
+        self.assertIn(b'</html>', content)
+
+
+class StaticFilesTests(SimpleTestCase):
+    CSS = 'body { color: black; }\n' * 50
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        source = os.path.join(directory, 'source')
+        self.root = os.path.join(directory, 'root')
+        os.makedirs(os.path.join(source, 'css'))
+        with open(os.path.join(source, 'css', 'site.css'), 'w') as css:
+            css.write(self.CSS)
+        settings = override_settings(
+            STATICFILES_DIRS=[source],
+            STATIC_ROOT=self.root,
+            INSTALLED_APPS=['django.contrib.staticfiles'],
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def request(self, app, path, **environ):
+        started = {}
+        fallback = []
+
+        def start_response(status, headers):
+            started['status'] = status
+            started['headers'] = dict(headers)
+
+        def application(environ, start_response):
+            fallback.append(environ['PATH_INFO'])
+            start_response('404 Not Found', [])
+            return []
+
+        app.application = application
+        body = b''.join(app(
+            {'PATH_INFO': path, 'REQUEST_METHOD': 'GET', **environ},
+            start_response,
+        ))
+        return started['status'], started['headers'], body, fallback
+
+    def test_unbuilt_assets_keep_plain_names(self):
+        self.assertEqual(
+            staticfiles_storage.url('css/site.css'), '/static/css/site.css'
+        )
+
+    def test_collect_and_serve(self):
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = staticfiles_storage.url('css/site.css')
+        self.assertRegex(url, r'^/static/css/site\.[0-9a-f]{12}\.css$')
+        for extension in ('.gz', '.br'):
+            self.assertTrue(os.path.exists(
+                os.path.join(self.root, url[len('/static/'):] + extension)
+            ))
+        app = StaticFiles(None)
+
+        status, headers, body, _ = self.request(
+            app, url, HTTP_ACCEPT_ENCODING='gzip, br'
+        )
+        self.assertEqual(headers['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(body).decode(), self.CSS)
+
+        status, headers, body, _ = self.request(
+            app, url, HTTP_ACCEPT_ENCODING='gzip'
+        )
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Cache-Control'], IMMUTABLE)
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(headers['Content-Type'], 'text/css')
+        self.assertEqual(gzip.decompress(body).decode(), self.CSS)
+
+        status, _, _, _ = self.request(
+            app, url, HTTP_ACCEPT_ENCODING='gzip',
+            HTTP_IF_NONE_MATCH=headers['ETag'],
+        )
+        self.assertEqual(status, '304 Not Modified')
+
+        status, headers, body, _ = self.request(app, '/static/css/site.css')
+        self.assertEqual(headers['Cache-Control'], MUTABLE)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body.decode(), self.CSS)
+
+        status, _, _, fallback = self.request(app, '/static/missing.css')
+        self.assertEqual(fallback, ['/static/missing.css'])
+
+
+class MediaTests(SimpleTestCase):
+    DATA = bytes(range(256)) * 4
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        os.makedirs(os.path.join(self.root, 'cache', 'ab'))
+        self.hashed = 'cache/ab/0123456789abcdef0123.jpg'
+        for name in ('posts/image.jpg', self.hashed, '.secret'):
+            os.makedirs(
+                os.path.dirname(os.path.join(self.root, name)), exist_ok=True
+            )
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(self.DATA)
+
+    def get(self, name, **headers):
+        return self.client.get(f'/media/{name}', **headers)
+
+    def test_whole_file(self):
+        response = self.get('posts/image.jpg')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.DATA)
+        self.assertEqual(response['Content-Type'], 'image/jpeg')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Cache-Control'], MEDIA_MUTABLE)
+        self.assertEqual(
+            self.get(self.hashed)['Cache-Control'], MEDIA_IMMUTABLE
+        )
+
+    def test_ranges(self):
+        cases = {
+            'bytes=10-19': (10, 19),
+            'bytes=1000-': (1000, 1023),
+            'bytes=-4': (1020, 1023),
+            'bytes=1020-5000': (1020, 1023),
+        }
+        for header, (start, end) in cases.items():
+            with self.subTest(header=header):
+                response = self.get('posts/image.jpg', HTTP_RANGE=header)
+                self.assertEqual(response.status_code, 206)
+                self.assertEqual(
+                    response['Content-Range'], f'bytes {start}-{end}/1024'
+                )
+                self.assertEqual(
+                    b''.join(response.streaming_content),
+                    self.DATA[start:end + 1],
+                )
+        response = self.get('posts/image.jpg', HTTP_RANGE='bytes=2000-')
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], 'bytes */1024')
+
+    def test_conditional_requests(self):
+        etag = self.get('posts/image.jpg')['ETag']
+        response = self.get('posts/image.jpg', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.get(
+            'posts/image.jpg', HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"old"'
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_files_outside_media_are_hidden(self):
+        for name in ('.secret', '../etc/passwd', 'posts', 'missing.jpg'):
+            with self.subTest(name=name):
+                self.assertEqual(self.get(name).status_code, 404)
+
+    def test_front_proxy_handoff(self):
+        with override_settings(MEDIA_ACCEL='nginx'):
+            response = self.get('posts/image.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'], '/protected-media/posts/image.jpg'
+        )
+        self.assertEqual(response.content, b'')
+        with override_settings(MEDIA_ACCEL='sendfile'):
+            response = self.get('posts/image.jpg')
+        self.assertEqual(
+            response['X-Sendfile'],
+            os.path.join(os.path.realpath(self.root), 'posts', 'image.jpg'),
+        )
+
+    def test_front_proxy_handoff_non_ascii_name(self):
+        with open(os.path.join(self.root, 'posts', 'кот.jpg'), 'wb') as file:
+            file.write(self.DATA)
+        with override_settings(MEDIA_ACCEL='nginx'):
+            response = self.get('posts/кот.jpg')
+        self.assertEqual(
+            response['X-Accel-Redirect'],
+            '/protected-media/posts/%D0%BA%D0%BE%D1%82.jpg'
+        )
+        with override_settings(MEDIA_ACCEL='sendfile'):
+            response = self.get('posts/кот.jpg')
+        self.assertTrue(
+            response['X-Sendfile'].endswith('/posts/%D0%BA%D0%BE%D1%82.jpg')
+        )
+
+
+class ResizeTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(MEDIA_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        os.makedirs(os.path.join(self.root, 'posts'))
+        Image.new('RGB', (400, 200), 'red').save(
+            os.path.join(self.root, 'posts', 'photo.jpg')
+        )
+        locmem = override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': self.id(),
+        }})
+        locmem.enable()
+        self.addCleanup(locmem.disable)
+
+    def size(self, content):
+        return Image.open(io.BytesIO(content)).size
+
+    def test_signed_variant_is_created_once(self):
+        url = resized_url('posts/photo.jpg', 100, 100, 'center')
+        self.assertTrue(url.startswith('/media/r/100x100/center/posts/'))
+        self.assertEqual(Template(
+            '{% load resize %}{% resized name "100x100" "center" %}'
+        ).render(Context({'name': 'posts/photo.jpg'})), escape(url))
+        with mock.patch('core.resize.resize', wraps=resize.resize) as made:
+            for _ in range(2):
+                response = self.client.get(url)
+                content = b''.join(response.streaming_content)
+                self.assertEqual(self.size(content), (100, 100))
+                self.assertEqual(response['Cache-Control'], MEDIA_IMMUTABLE)
+        self.assertEqual(made.call_count, 1)
+        self.assertTrue(os.path.exists(
+            os.path.join(self.root, 'r', '100x100', 'center', 'posts',
+                         'photo.jpg')
+        ))
+
+    def test_fit_keeps_proportions(self):
+        response = self.client.get(
+            resized_url('posts/photo.jpg', 100, 100, 'fit')
+        )
+        content = b''.join(response.streaming_content)
+        self.assertEqual(self.size(content), (100, 50))
+
+    def test_bad_requests(self):
+        url = resized_url('posts/photo.jpg', 100, 100, 'center')
+        urls = (
+            url[:-1] + ('0' if url[-1] != '0' else '1'),
+            url.replace('100x100', '200x100', 1),
+            resized_url('posts/missing.jpg', 100, 100, 'center'),
+            resized_url('posts/photo.jpg', 100, 100, 'sideways'),
+            resized_url('posts/photo.jpg', 9000, 100, 'center'),
+        )
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 404)
+
+    def test_waiters_outlast_slow_resize(self):
+        url = resized_url('posts/photo.jpg', 50, 50, 'center')
+        source = os.path.join(self.root, 'posts', 'photo.jpg')
+        target = os.path.join(
+            os.path.realpath(self.root),
+            resize.variant_name(50, 50, 'center', 'posts/photo.jpg')
+        )
+        # Вариант уже делает другой процесс, и делает долго.
+        key = lock_key(f'resize:{target}')
+        cache.add(key, 1)
+        real_resize = resize.resize
+
+        def finish():
+            time.sleep(0.3)
+            real_resize(source, target, 50, 50, 'center')
+            cache.delete(key)
+
+        other = threading.Thread(target=finish)
+        other.start()
+        clock = iter(range(0, 10 ** 6, 10))
+        with mock.patch('core.resize.resize') as made, \
+                mock.patch('time.monotonic', lambda: next(clock)):
+            response = self.client.get(url)
+        other.join()
+        self.assertEqual(response.status_code, 200)
+        response.close()
+        made.assert_not_called()
+
+    def test_concurrent_requests_are_coalesced(self):
+        url = resized_url('posts/photo.jpg', 50, 50, 'center')
+        started = threading.Barrier(4)
+        statuses = []
+
+        def slow_resize(*args):
+            time.sleep(0.2)
+            real_resize(*args)
+
+        def fetch():
+            started.wait()
+            response = self.client_class().get(url)
+            statuses.append(response.status_code)
+            response.close()
+
+        real_resize = resize.resize
+        with mock.patch('core.resize.resize', side_effect=slow_resize) as made:
+            threads = [threading.Thread(target=fetch) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(statuses, [200] * 4)
+        self.assertEqual(made.call_count, 1)
@@ -15,3 +15,9 @@ def permission_denied(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def read_only(request):
+    response = render(request, 'core/503.html', status=503)
+    response['Retry-After'] = 600
+    return response
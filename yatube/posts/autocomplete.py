@@ -0,0 +1,181 @@
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.core.cache import cache
+from django.urls import NoReverseMatch, reverse
+
+from .models import Group, User
+
+MAX_SUGGESTIONS = 10
+# Как часто процесс сверяет свою копию индекса с версией в общем кэше.
+SYNC_INTERVAL = 5
+VERSION_KEY = 'posts:autocomplete:version'
+# Изменения индекса лежат в общем кэше под номерами версий: процессы
+# применяют чужие изменения к своей копии, а строят индекс заново,
+# только если отстали сильнее журнала или его часть вытеснена.
+JOURNAL_SIZE = 256
+JOURNAL_TIMEOUT = 60 * 10
+
+
+class PrefixIndex:
+    """Отсортированный список ключей с поиском по префиксу (bisect).
+
+    Каждому объекту соответствует одна или несколько строк-ключей,
+    например заголовок и slug группы. Держит всё в памяти процесса.
+    """
+
+    def __init__(self):
+        self._keys = []
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def normalize(text):
+        return text.casefold()
+
+    def add(self, ident, keys, payload):
+        with self._lock:
+            self._discard(ident)
+            keys = {self.normalize(key) for key in keys if key}
+            for key in keys:
+                insort(self._keys, (key, ident))
+            self._entries[ident] = (keys, payload)
+
+    def remove(self, ident):
+        with self._lock:
+            self._discard(ident)
+
+    def _discard(self, ident):
+        keys, _ = self._entries.pop(ident, ((), None))
+        for key in keys:
+            position = bisect_left(self._keys, (key, ident))
+            del self._keys[position]
+
+    def search(self, prefix, limit=MAX_SUGGESTIONS):
+        prefix = self.normalize(prefix)
+        found = {}
+        with self._lock:
+            position = bisect_left(self._keys, (prefix,))
+            while position < len(self._keys) and len(found) < limit:
+                key, ident = self._keys[position]
+                if not key.startswith(prefix):
+                    break
+                found.setdefault(ident, self._entries[ident][1])
+                position += 1
+        return list(found.values())
+
+
+class Suggestions:
+    """Индекс имён пользователей и групп для подсказок при наборе."""
+
+    def __init__(self):
+        self.index = None
+        self.version = None
+        self.checked = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def entry(ident, keys, label, view, arg):
+        """Запись индекса или None, если у объекта нет своей страницы."""
+        try:
+            url = reverse(view, args=(arg,))
+        except NoReverseMatch:
+            return None
+        payload = {'type': ident[0], 'label': label, 'url': url}
+        return ident, keys, payload
+
+    def user_entry(self, pk, username):
+        return self.entry(
+            ('user', pk), (username,), username, 'posts:profile', username
+        )
+
+    def group_entry(self, pk, title, slug):
+        return self.entry(
+            ('group', pk), (title, slug), title, 'posts:group_list', slug
+        )
+
+    def build(self):
+        index = PrefixIndex()
+        entries = [
+            self.user_entry(*user)
+            for user in User.objects.values_list('pk', 'username')
+        ] + [
+            self.group_entry(*group)
+            for group in Group.objects.values_list('pk', 'title', 'slug')
+        ]
+        for entry in entries:
+            if entry is not None:
+                index.add(*entry)
+        return index
+
+    @staticmethod
+    def journal_key(version):
+        return f'{VERSION_KEY}:{version}'
+
+    def current(self):
+        now = time.monotonic()
+        if self.index is not None and now - self.checked < SYNC_INTERVAL:
+            return self.index
+        with self._lock:
+            version = cache.get(VERSION_KEY)
+            if self.index is None or not self.catch_up(version):
+                self.index = self.build()
+            self.version = version
+            self.checked = now
+            return self.index
+
+    def catch_up(self, version):
+        """Применяет к индексу изменения из журнала; False, если их
+        не восстановить и индекс надо строить заново."""
+        if version == self.version:
+            return True
+        if version is None or self.version is None:
+            return False
+        if not 0 < version - self.version <= JOURNAL_SIZE:
+            return False
+        numbers = range(self.version + 1, version + 1)
+        journal = cache.get_many([self.journal_key(n) for n in numbers])
+        if len(journal) < len(numbers):
+            return False
+        for number in numbers:
+            self.apply(*journal[self.journal_key(number)])
+        return True
+
+    def apply(self, add, remove):
+        if remove is not None:
+            self.index.remove(remove)
+        if add is not None:
+            self.index.add(*add)
+
+    def search(self, prefix, limit=MAX_SUGGESTIONS):
+        return self.current().search(prefix, limit)
+
+    def changed(self, add=None, remove=None):
+        """Обновляет индекс этого процесса и публикует изменение
+        в журнале в общем кэше для остальных."""
+        if self.index is not None:
+            self.apply(add, remove)
+        # Начинаем со времени, а не с нуля: если версию вытеснили из
+        # кэша, новые номера не совпадут со старыми и процессы
+        # не применят чужой журнал поверх своего индекса.
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            version = None
+        if version is not None:
+            cache.set(
+                self.journal_key(version), (add, remove), JOURNAL_TIMEOUT
+            )
+        if version is not None and self.version in (version - 1, None):
+            # Между нашими изменениями других не было: индекс актуален.
+            self.version = version
+        else:
+            self.checked = 0
+
+
+suggestions = Suggestions()
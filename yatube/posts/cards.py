@@ -0,0 +1,132 @@
+from functools import lru_cache
+from itertools import islice
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.db.models import QuerySet
+from django.urls import get_script_prefix, reverse
+from django.utils.formats import date_format
+from django.utils.html import escape
+from django.utils.timezone import template_localtime
+
+from .thumbnails import image_tag, resolve
+
+# Те же параметры, что в {% cache %} и {% thumbnail_img %} из
+# posts/post-display.html: оба пути пишут и читают одни фрагменты.
+CARD_TIMEOUT = 86400
+# Карточка с заглушкой вместо миниатюры живёт недолго: если фоновая
+# задача потерялась, следующий промах снова найдёт миниатюру
+# и поставит её в очередь.
+PLACEHOLDER_TIMEOUT = 60
+CARD_FRAGMENT = 'post_card'
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# По сколько постов читать из базы и рендерить за раз в card_rows(),
+# когда строки страницы ещё не прочитаны.
+CHUNK_SIZE = 5
+
+CARD = '''
+<article>
+  <ul>
+    <li>
+      Автор: {full_name}
+      <a href="{profile_url}">все посты пользователя</a>
+    </li>
+    <li>Дата публикации: {pub_date}</li>
+  </ul>
+  {image}
+  <p>
+    {text}
+  </p>
+  <a href="{detail_url}">подробная информация</a>
+</article>
+'''
+
+
+@lru_cache(maxsize=4096)
+def _url(view, arg, prefix):
+    return escape(reverse(view, args=(arg,)))
+
+
+def url(view, arg):
+    """reverse() с памятью: на странице ссылки повторяются."""
+    return _url(view, arg, get_script_prefix())
+
+
+def card_key(post):
+    return make_template_fragment_key(CARD_FRAGMENT, [
+        post.pk, post.updated_at,
+        post.author.username, post.author.get_full_name(),
+    ])
+
+
+def render_fragment(post, thumbnails=None):
+    pub_date = ''
+    if post.pub_date is not None:
+        pub_date = date_format(template_localtime(post.pub_date), 'd E Y')
+    return CARD.format(
+        full_name=escape(post.author.get_full_name()),
+        profile_url=url('posts:profile', post.author.username),
+        pub_date=pub_date,
+        image=image_tag(
+            post.image, THUMBNAIL_GEOMETRY, css_class='card-img my-2',
+            resolved=thumbnails, **THUMBNAIL_OPTIONS
+        ),
+        text=escape(post.text),
+        detail_url=url('posts:post_detail', post.pk),
+    )
+
+
+def render_cards(posts):
+    """HTML карточек, байт в байт как {% include 'posts/post-display.html' %}
+    для каждого поста, но без шаблонизатора. Кэш карточек читается
+    одним get_many, миниатюры для непопавших — одним resolve()."""
+    posts = list(posts)
+    keys = [card_key(post) for post in posts]
+    cached = cache.get_many(keys)
+    stale = [post for post, key in zip(posts, keys) if key not in cached]
+    thumbnails = resolve(
+        [post.image for post in stale], THUMBNAIL_GEOMETRY,
+        **THUMBNAIL_OPTIONS
+    )
+    missing, pending = {}, {}
+    cards = []
+    for post, key in zip(posts, keys):
+        fragment = cached.get(key)
+        if fragment is None:
+            fragment = render_fragment(post, thumbnails)
+            if post.image and thumbnails.get(post.image.name) is None:
+                pending[key] = fragment
+            else:
+                missing[key] = fragment
+        cards.append(f'\n{fragment}\n')
+    if missing:
+        cache.set_many(missing, CARD_TIMEOUT)
+    if pending:
+        cache.set_many(pending, PLACEHOLDER_TIMEOUT)
+    return cards
+
+
+def card_rows(posts, size=CHUNK_SIZE):
+    """(пост, карточка) по мере чтения строк.
+
+    Ещё не выполненный QuerySet страницы читается итератором пачками
+    по size, и каждая пачка рендерится, как только пришла; прочитанные
+    строки остаются в странице. Остальные страницы (ленты, поиск)
+    читаются одним запросом и рендерятся целиком: кэш карточек
+    и миниатюры — по одному обращению на страницу.
+    """
+    rows = getattr(posts, 'object_list', posts)
+    if not isinstance(rows, QuerySet) or rows._result_cache is not None:
+        rows = list(posts)
+        yield from zip(rows, render_cards(rows))
+        return
+    read = []
+    chunks = rows.iterator(chunk_size=size)
+    chunk = list(islice(chunks, size))
+    while chunk:
+        read.extend(chunk)
+        yield from zip(chunk, render_cards(chunk))
+        chunk = list(islice(chunks, size))
+    if rows is not posts:
+        posts.object_list = read
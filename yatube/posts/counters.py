@@ -0,0 +1,113 @@
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+def _deltas(**deltas):
+    return {
+        field: Greatest(F(field) + delta, 0)
+        for field, delta in deltas.items()
+    }
+
+
+def bump_user(user_id, **deltas):
+    """Атомарно сдвигает счётчики пользователя. Если строки счётчиков
+    нет, сдвигать нечего: reconcile_counters создаст её уже
+    с актуальными значениями."""
+    UserStats.objects.filter(user_id=user_id).update(**_deltas(**deltas))
+
+
+def bump_group(group_id, delta):
+    if group_id:
+        Group.objects.filter(pk=group_id).update(**_deltas(posts_count=delta))
+
+
+def bump_post(post_id, delta):
+    Post.objects.filter(pk=post_id).update(**_deltas(comments_count=delta))
+
+
+def _counts(queryset, field, ids):
+    return dict(
+        queryset.filter(**{f'{field}__in': ids})
+        .order_by()
+        .values_list(field)
+        .annotate(n=Count('pk'))
+    )
+
+
+def _chunks(queryset, chunk_size):
+    last_pk = None
+    while True:
+        chunk = queryset.order_by('pk')
+        if last_pk is not None:
+            chunk = chunk.filter(pk__gt=last_pk)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_pk = chunk[-1].pk
+
+
+def reconcile_users(chunk_size):
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in missing.iterator()],
+        batch_size=chunk_size,
+        ignore_conflicts=True
+    )
+    fixed = 0
+    authors = Follow.objects.filter(author__isnull=False)
+    for chunk in _chunks(UserStats.objects.all(), chunk_size):
+        ids = [stats.pk for stats in chunk]
+        actual = {
+            'posts_count': _counts(Post.objects, 'author_id', ids),
+            'followers_count': _counts(authors, 'author_id', ids),
+            'following_count': _counts(authors, 'user_id', ids),
+        }
+        drifted = []
+        for stats in chunk:
+            changed = False
+            for field, counts in actual.items():
+                value = counts.get(stats.pk, 0)
+                if getattr(stats, field) != value:
+                    setattr(stats, field, value)
+                    changed = True
+            if changed:
+                drifted.append(stats)
+        UserStats.objects.bulk_update(drifted, list(actual))
+        fixed += len(drifted)
+    return fixed
+
+
+def reconcile_groups(chunk_size):
+    fixed = 0
+    for chunk in _chunks(Group.objects.all(), chunk_size):
+        counts = _counts(Post.objects, 'group_id', [g.pk for g in chunk])
+        drifted = [
+            group for group in chunk
+            if group.posts_count != counts.get(group.pk, 0)
+        ]
+        for group in drifted:
+            group.posts_count = counts.get(group.pk, 0)
+        Group.objects.bulk_update(drifted, ['posts_count'])
+        fixed += len(drifted)
+    return fixed
+
+
+def reconcile_posts(chunk_size):
+    fixed = 0
+    posts = Post.objects.only('pk', 'comments_count')
+    for chunk in _chunks(posts, chunk_size):
+        counts = _counts(Comment.objects, 'post_id', [p.pk for p in chunk])
+        drifted = [
+            post for post in chunk
+            if post.comments_count != counts.get(post.pk, 0)
+        ]
+        for post in drifted:
+            post.comments_count = counts.get(post.pk, 0)
+        Post.objects.bulk_update(drifted, ['comments_count'])
+        fixed += len(drifted)
+    return fixed
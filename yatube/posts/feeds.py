@@ -0,0 +1,312 @@
+import hashlib
+import heapq
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .fragments import generations
+from .models import FeedEntry, Follow, Post, UserStats
+
+logger = logging.getLogger(__name__)
+
+
+def sort_key(post):
+    return post.pub_date, post.pk
+
+
+class PostStream:
+    """Поток постов одного источника, упорядоченный по (pub_date, id).
+
+    Если строки источника — не посты (например, FeedEntry), `post`
+    задаёт атрибут, через который из строки достаётся пост.
+    """
+
+    def __init__(self, queryset, date_field='pub_date', id_field='pk',
+                 post=None):
+        self.queryset = queryset
+        self.date_field = date_field
+        self.id_field = id_field
+        self.post = post
+
+    def _rows(self, queryset):
+        if self.post is None:
+            return list(queryset)
+        return [getattr(row, self.post) for row in queryset]
+
+    def _ordered(self, queryset, descending=True):
+        sign = '-' if descending else ''
+        return queryset.order_by(
+            sign + self.date_field, sign + self.id_field
+        )
+
+    def count(self):
+        return self.queryset.count()
+
+    def newest(self, limit):
+        return self._rows(self._ordered(self.queryset)[:limit])
+
+    def older_than(self, key, limit):
+        pub_date, pk = key
+        older = (
+            Q(**{f'{self.date_field}__lt': pub_date})
+            | Q(**{self.date_field: pub_date, f'{self.id_field}__lt': pk})
+        )
+        return self._rows(
+            self._ordered(self.queryset.filter(older))[:limit]
+        )
+
+    def newer_than(self, key, limit):
+        """Строки новее key в порядке возрастания."""
+        pub_date, pk = key
+        newer = (
+            Q(**{f'{self.date_field}__gt': pub_date})
+            | Q(**{self.date_field: pub_date, f'{self.id_field}__gt': pk})
+        )
+        return self._rows(
+            self._ordered(self.queryset.filter(newer), False)[:limit]
+        )
+
+
+class MergedFeed:
+    """Слияние нескольких упорядоченных потоков в одну ленту.
+
+    Из каждого источника читается не больше строк, чем нужно для
+    страницы, а дальше потоки сливаются через heapq.merge. Объект
+    понимает срезы и count(), поэтому подходит для Paginator.
+    """
+
+    def __init__(self, streams, overlaps=(), scopes=()):
+        self.streams = streams
+        # Запросы на посты, попавшие сразу в несколько потоков:
+        # их количество вычитается из count().
+        self.overlaps = overlaps
+        # Области posts.fragments, от которых зависит содержимое ленты.
+        self.scopes = scopes
+
+    def count_key(self, name):
+        """Ключ для кэша count(): меняется вместе с поколениями
+        источников, так что публикация поста сдвигает одно поколение
+        автора, а не счётчики всех его подписчиков."""
+        version = generations(*self.scopes)
+        return f'{name}:{hashlib.md5(version.encode()).hexdigest()}'
+
+    def _merge(self, sources, limit, descending=True):
+        merged = heapq.merge(*sources, key=sort_key, reverse=descending)
+        return list(islice(self._unique(merged), limit))
+
+    @staticmethod
+    def _unique(posts):
+        previous = None
+        for post in posts:
+            if post.pk != previous:
+                yield post
+            previous = post.pk
+
+    def count(self):
+        count = sum(stream.count() for stream in self.streams)
+        return count - sum(overlap.count() for overlap in self.overlaps)
+
+    def newest(self, limit):
+        return self._merge(
+            [stream.newest(limit) for stream in self.streams], limit
+        )
+
+    def older_than(self, key, limit):
+        return self._merge(
+            [stream.older_than(key, limit) for stream in self.streams],
+            limit
+        )
+
+    def newer_than(self, key, limit):
+        return self._merge(
+            [stream.newer_than(key, limit) for stream in self.streams],
+            limit,
+            descending=False
+        )
+
+    def __getitem__(self, item):
+        return self.newest(item.stop)[item]
+
+
+def is_celebrity(author_id):
+    return UserStats.objects.filter(
+        user_id=author_id,
+        followers_count__gte=settings.FEED_FANOUT_THRESHOLD
+    ).exists()
+
+
+def followed_authors(user):
+    """[(id автора, подмешивать ли его посты при чтении)] подписок
+    пользователя. Подмешиваются посты авторов с числом подписчиков от
+    FEED_DEMOTE_THRESHOLD: пока бывший популярный автор не опустился
+    ниже, его посты раскладываются по лентам в фоне (demoted)."""
+    threshold = min(
+        settings.FEED_DEMOTE_THRESHOLD, settings.FEED_FANOUT_THRESHOLD
+    )
+    return [
+        (author_id, (followers or 0) >= threshold)
+        for author_id, followers in Follow.objects.filter(
+            user=user, author__isnull=False
+        ).values_list('author_id', 'author__stats__followers_count')
+    ]
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if is_celebrity(post.author_id):
+        return
+    followers = Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in followers
+        ],
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).values_list(
+        'pk', 'pub_date'
+    )[:settings.FEED_BACKFILL_SIZE]
+    FeedEntry.objects.bulk_create(
+        [
+            FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+            for pk, pub_date in posts
+        ],
+        ignore_conflicts=True
+    )
+
+
+def since_key(author_id):
+    return f'posts:feeds:celebrity_since:{author_id}'
+
+
+def promoted(author_id):
+    """Автор стал популярным: с этого момента его посты не
+    раскладываются по лентам."""
+    cache.set(since_key(author_id), timezone.now(), None)
+
+
+def demoted(author_id):
+    """Автор перестал быть популярным: посты, опубликованные, пока он
+    был популярен, раскладываются по лентам подписчиков в фоне после
+    коммита. Пока это идёт, они подмешиваются при чтении
+    (followed_authors)."""
+    since = cache.get(since_key(author_id))
+    transaction.on_commit(lambda: refills.submit(author_id, since))
+
+
+def refill(author_id, since=None):
+    """Последние посты автора (начиная с since, если известно) во все
+    ленты его подписчиков, пачками по FEED_REFILL_BATCH строк."""
+    posts = Post.objects.filter(author_id=author_id)
+    if since is not None:
+        posts = posts.filter(pub_date__gte=since)
+    posts = list(posts.order_by('-pub_date', '-pk').values_list(
+        'pk', 'pub_date'
+    )[:settings.FEED_BACKFILL_SIZE])
+    if not posts:
+        return
+    followers = Follow.objects.filter(author_id=author_id).order_by(
+        'user_id'
+    ).values_list('user_id', flat=True).iterator()
+    per_chunk = max(settings.FEED_REFILL_BATCH // len(posts), 1)
+    chunk = list(islice(followers, per_chunk))
+    while chunk:
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for user_id in chunk
+                for pk, pub_date in posts
+            ],
+            ignore_conflicts=True
+        )
+        chunk = list(islice(followers, per_chunk))
+
+
+class Refills:
+    """Поток, в котором выполняется refill(): тяжёлая вставка не
+    задерживает запрос, отписка от которого её вызвала."""
+
+    def __init__(self):
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def submit(self, author_id, since):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='feeds'
+                )
+        self.executor.submit(self.run, author_id, since)
+
+    @staticmethod
+    def run(author_id, since):
+        try:
+            refill(author_id, since)
+        except Exception:
+            logger.exception('Не удалось разложить посты %s', author_id)
+        finally:
+            close_old_connections()
+
+
+refills = Refills()
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id
+    ).delete()
+
+
+def follow_feed(user):
+    """Лента /follow/: k-way слияние потоков подписок.
+
+    Источники: материализованные записи ленты, посты популярных авторов
+    и посты групп, на которые подписан пользователь. Каждый поток уже
+    упорядочен по (pub_date, id), поэтому на страницу из него читается
+    не больше страницы строк.
+    """
+    entries = FeedEntry.objects.filter(user=user).select_related(
+        'post__author', 'post__group'
+    )
+    streams = [PostStream(entries, id_field='post_id', post='post')]
+    overlaps = []
+    authors = followed_authors(user)
+    celebrities = [author_id for author_id, celebrity in authors if celebrity]
+    if celebrities:
+        overlaps.append(entries.filter(post__author_id__in=celebrities))
+    groups = list(
+        Follow.objects.filter(user=user, group__isnull=False)
+        .values_list('group_id', flat=True)
+    )
+    if groups:
+        overlaps.append(Post.objects.filter(
+            Q(pk__in=entries.values('post_id'))
+            | Q(author_id__in=celebrities),
+            group_id__in=groups
+        ))
+    sources = (
+        [Q(author_id=author_id) for author_id in celebrities]
+        + [Q(group_id=group_id) for group_id in groups]
+    )
+    for source in sources:
+        streams.append(PostStream(
+            Post.objects.filter(source).select_related('author', 'group')
+        ))
+    scopes = [f'follow:{user.pk}']
+    scopes += [f'profile:{author_id}' for author_id, _ in authors]
+    scopes += [f'group:{group_id}' for group_id in groups]
+    return MergedFeed(streams, overlaps, scopes)
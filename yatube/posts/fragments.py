@@ -0,0 +1,39 @@
+import time
+
+from django.core.cache import cache
+
+# Фрагменты лент кэшируются надолго (сутки): ключ фрагмента включает
+# поколения его источников, и запись в источник сразу делает старый
+# ключ ненужным — он просто доживает свой срок.
+
+
+def generation_key(scope: str) -> str:
+    return f'posts:generation:{scope}'
+
+
+def generations(*scopes: str) -> str:
+    """Текущие поколения областей одной строкой для ключа фрагмента."""
+    keys = [generation_key(scope) for scope in scopes]
+    current = cache.get_many(keys)
+    for key in keys:
+        if key not in current:
+            # Начинаем со времени, а не с единицы: если ключ поколения
+            # вытеснили из кэша, старые фрагменты не совпадут с новыми.
+            cache.add(key, time.time_ns(), None)
+            current[key] = cache.get(key)
+    return '.'.join(str(current[key]) for key in keys)
+
+
+def bump(*scopes: str) -> None:
+    for scope in set(scopes):
+        try:
+            cache.incr(generation_key(scope))
+        except ValueError:
+            # Ключа нет: при следующем чтении начнётся новое поколение.
+            pass
+
+
+def post_scopes(author_id, *group_ids):
+    scopes = ['index', f'profile:{author_id}']
+    scopes += [f'group:{group_id}' for group_id in group_ids if group_id]
+    return scopes
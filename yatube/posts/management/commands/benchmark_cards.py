@@ -0,0 +1,98 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.template import engines
+from django.test import override_settings
+from django.utils import timezone
+
+from posts.models import Post, User
+
+# Так шаблоны страниц выводили ленту до posts.cards.
+TEMPLATE_LOOP = '''{% for post in posts %}
+    {% include 'posts/post-display.html' %}
+{% endfor %}'''
+CARDS_LOOP = '''{% load cards %}{% post_cards posts as cards %}\
+{% for post, card in cards %}
+    {{ card }}
+{% endfor %}'''
+
+CACHES = {
+    # Без кэша: каждая карточка рендерится заново.
+    'холодный': 'django.core.cache.backends.dummy.DummyCache',
+    # Все карточки в кэше, рендер только собирает страницу.
+    'тёплый': 'django.core.cache.backends.locmem.LocMemCache',
+}
+
+
+def sample_posts(count):
+    now = timezone.now()
+    authors = [
+        User(pk=i, username=f'author{i}', first_name='Автор', last_name=str(i))
+        for i in range(count)
+    ]
+    return [
+        Post(
+            pk=i, text=f'Текст поста <{i}> ' * 20, author=authors[i],
+            pub_date=now, updated_at=now,
+        )
+        for i in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = ('Сравнивает рендер ленты через include шаблона карточки '
+            'и через posts.cards.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=1000,
+            help='Сколько страниц отрендерить каждым способом.'
+        )
+        parser.add_argument(
+            '--per-page',
+            type=int,
+            default=10,
+            help='Сколько постов на странице.'
+        )
+
+    def handle(self, *args, pages, per_page, **options):
+        engine = engines['django']
+        loops = {
+            'include': engine.from_string(TEMPLATE_LOOP),
+            'cards': engine.from_string(CARDS_LOOP),
+        }
+        posts = sample_posts(per_page)
+        for state, backend in CACHES.items():
+            with override_settings(CACHES={
+                **settings.CACHES, 'default': {'BACKEND': backend}
+            }):
+                html = {
+                    name: template.render({'posts': posts})
+                    for name, template in loops.items()
+                }
+                if html['include'] != html['cards']:
+                    self.stderr.write('HTML карточек отличается от шаблона.')
+                timings = {}
+                for name, template in loops.items():
+                    timings[name] = self.measure(template, posts, pages)
+                    self.stdout.write(
+                        f'{state:10}{name:10}'
+                        f'{timings[name] * 1e3:10.3f} мс/страница'
+                    )
+                self.stdout.write(
+                    f'{state:10}{"выигрыш":10}'
+                    f'{timings["include"] / timings["cards"]:10.1f}×'
+                )
+
+    @staticmethod
+    def measure(template, posts, pages):
+        context = {'posts': posts}
+        # Первый рендер заполняет кэш и загружает шаблоны.
+        template.render(context)
+        started = time.perf_counter()
+        for _ in range(pages):
+            template.render(context)
+        return (time.perf_counter() - started) / pages
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from posts.counters import reconcile_groups, reconcile_posts, reconcile_users
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает разошедшиеся денормализованные счётчики.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Сколько строк проверять за один запрос.'
+        )
+
+    def handle(self, *args, chunk_size, **options):
+        for name, reconcile in (
+            ('пользователей', reconcile_users),
+            ('групп', reconcile_groups),
+            ('постов', reconcile_posts),
+        ):
+            fixed = reconcile(chunk_size)
+            self.stdout.write(f'Исправлено счётчиков {name}: {fixed}')
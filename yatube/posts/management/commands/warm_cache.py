@@ -0,0 +1,53 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from posts.utils import NUMBERED_PAGES
+from posts.warmup import warm, warmup_urls
+
+
+class Command(BaseCommand):
+    help = 'Заранее заполняет кэш страниц после выкладки или рестарта.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=NUMBERED_PAGES,
+            help='Сколько первых страниц главной прогреть.'
+        )
+        parser.add_argument(
+            '--profiles',
+            type=int,
+            default=50,
+            help='Сколько профилей самых читаемых авторов прогреть.'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=4,
+            help='Сколько страниц рендерить одновременно.'
+        )
+
+    def handle(self, *args, pages, profiles, concurrency, **options):
+        started = time.perf_counter()
+        urls = list(warmup_urls(pages, profiles))
+        warmed = failed = 0
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            for url, status in zip(urls, pool.map(self.warm, urls)):
+                if status == 200:
+                    warmed += 1
+                else:
+                    failed += 1
+                    self.stderr.write(f'{url}: {status}')
+        self.stdout.write(
+            f'Прогрето страниц: {warmed}, с ошибкой: {failed}, '
+            f'за {time.perf_counter() - started:.2f} с'
+        )
+
+    def warm(self, url):
+        try:
+            return warm(url)
+        except Exception as error:
+            return repr(error)
@@ -0,0 +1,68 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:41
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_feeds(apps, schema_editor):
+    """Ленты существующих подписок, как feeds.backfill при подписке:
+    последние FEED_BACKFILL_SIZE постов каждого автора, кроме
+    популярных (их посты подмешиваются при чтении)."""
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    celebrities = Follow.objects.values('author').annotate(
+        n=Count('pk')
+    ).filter(n__gte=settings.FEED_FANOUT_THRESHOLD).values('author')
+    follows = Follow.objects.exclude(author__in=celebrities).order_by(
+        'author_id'
+    ).values_list('author_id', 'user_id')
+    posts = {}
+    for author_id, user_id in follows.iterator():
+        if author_id not in posts:
+            posts = {author_id: list(
+                Post.objects.filter(author_id=author_id)
+                .order_by('-pub_date', '-pk')
+                .values_list('pk', 'pub_date')[:settings.FEED_BACKFILL_SIZE]
+            )}
+        FeedEntry.objects.bulk_create(
+            [
+                FeedEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+                for pk, pub_date in posts[author_id]
+            ],
+            ignore_conflicts=True
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0010_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='feed_entries', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ('-pub_date', '-post'),
+            },
+        ),
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='feed_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='feedentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_feed_entry'),
+        ),
+        migrations.RunPython(fill_feeds, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:42
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0011_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='follow',
+            name='group',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='followers', to='posts.Group'),
+        ),
+        migrations.AlterField(
+            model_name='follow',
+            name='author',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='following', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.CheckConstraint(check=models.Q(models.Q(('author__isnull', False), ('group__isnull', True)), models.Q(('author__isnull', True), ('group__isnull', False)), _connector='OR'), name='follow_author_or_group'),
+        ),
+    ]
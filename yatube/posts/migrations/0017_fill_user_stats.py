@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:12
+
+from django.conf import settings
+from django.db import migrations
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def count_of(queryset, field):
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('pk'))
+        .values('n')
+    ), 0)
+
+
+def fill_user_stats(apps, schema_editor):
+    User = apps.get_model(*settings.AUTH_USER_MODEL.split('.'))
+    UserStats = apps.get_model('posts', 'UserStats')
+    Post = apps.get_model('posts', 'Post')
+    Follow = apps.get_model('posts', 'Follow')
+    missing = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True
+    )
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in missing],
+        ignore_conflicts=True
+    )
+    authors = Follow.objects.filter(author__isnull=False)
+    UserStats.objects.update(
+        posts_count=count_of(Post.objects.all(), 'author'),
+        followers_count=count_of(authors, 'author'),
+        following_count=count_of(authors, 'user'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0016_post_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_user_stats, migrations.RunPython.noop),
+    ]
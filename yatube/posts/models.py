@@ -8,6 +8,11 @@ class Group(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField()
+    posts_count = models.PositiveIntegerField(
+        'Количество постов',
+        default=0,
+        editable=False
+    )
 
     def __str__(self):
         return self.title
@@ -24,6 +29,12 @@ class Post(models.Model):
         auto_now_add=True
     )
 
+    # Версия карточки поста в кэше: меняется при каждом сохранении.
+    updated_at = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
+
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -47,6 +58,12 @@ class Post(models.Model):
         blank=True
     )
 
+    comments_count = models.PositiveIntegerField(
+        'Количество комментариев',
+        default=0,
+        editable=False
+    )
+
     def __str__(self):
         return self.text[:15]
 
@@ -54,6 +71,20 @@ class Post(models.Model):
         ordering = ('-pub_date',)
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
 
 
 class Comment(models.Model):
@@ -76,6 +107,15 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        ordering = ('created',)
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+        ]
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -85,4 +125,87 @@ class Follow(models.Model):
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
-        related_name='following')
+        related_name='following',
+        blank=True,
+        null=True)
+    group = models.ForeignKey(
+        Group,
+        on_delete=models.CASCADE,
+        related_name='followers',
+        blank=True,
+        null=True)
+
+    class Meta:
+        constraints = [
+            models.CheckConstraint(
+                check=(
+                    models.Q(author__isnull=False, group__isnull=True)
+                    | models.Q(author__isnull=True, group__isnull=False)
+                ),
+                name='follow_author_or_group'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'author'],
+                name='unique_follow_author'
+            ),
+            models.UniqueConstraint(
+                fields=['user', 'group'],
+                name='unique_follow_group'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries')
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        ordering = ('-pub_date', '-post')
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_feed_entry'
+            ),
+        ]
+
+
+class UserStats(models.Model):
+    """Денормализованные счётчики пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats')
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
+    @classmethod
+    def for_user(cls, user):
+        """Счётчики пользователя. Строку создают сигнал при регистрации,
+        миграция и reconcile_counters; если её всё же нет, счётчики
+        считаются по таблицам, но не сохраняются: GET ничего не пишет."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(
+                user_id=user.pk,
+                posts_count=user.posts.count(),
+                followers_count=user.following.count(),
+                following_count=user.follower.filter(
+                    author__isnull=False
+                ).count(),
+            )
@@ -0,0 +1,164 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from core.compression import mark_shared
+from core.database import latency_budget
+from core.stampede import get_or_compute
+
+from .fragments import generations
+from .models import Group, Post, User
+from .personal import fill
+
+# Страница живёт в кэше, пока не сменятся поколения её источников;
+# срок нужен только чтобы вычищать неактуальные копии.
+PAGE_TIMEOUT = 60 * 60 * 24
+# Последняя удачная версия страницы на случай проблем с базой.
+STALE_TIMEOUT = 60 * 60 * 24 * 7
+
+
+def page_key(etag: str) -> str:
+    return f'posts:page:{etag}'
+
+
+def stale_key(request) -> str:
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'posts:page:stale:{path}'
+
+
+def weak_etags(header):
+    """ETag из If-None-Match для слабого сравнения: сжатые ответы
+    уходят с W/ (core.middleware.CompressionMiddleware)."""
+    return [
+        etag[2:] if etag.startswith('W/') else etag
+        for etag in parse_etags(header)
+    ]
+
+
+def shared_page(scopes):
+    """Кэширует страницу целиком, одну на всех пользователей.
+
+    scopes(**kwargs) возвращает области, от которых зависит страница,
+    или None, если страницы нет (тогда отвечает сама view). В кэше
+    лежит оболочка: персональные куски при отдаче перерисовываются
+    для текущего пользователя (см. personal.fill). Анонимам ещё и
+    отдаётся ETag из адреса и поколений областей: на совпавший
+    If-None-Match отвечаем 304, ничего не рендеря.
+
+    Если база не ответила за PAGE_LATENCY_BUDGET секунд или упала,
+    отдаётся последняя удачная версия страницы с пометкой о
+    несвежести (stale-if-error).
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            budget = getattr(settings, 'PAGE_LATENCY_BUDGET', None)
+            try:
+                with latency_budget(budget):
+                    return serve(view, scopes, request, *args, **kwargs)
+            except DatabaseError:
+                response = cache.get(stale_key(request))
+                if response is None:
+                    raise
+                return serve_stale(request, response)
+        return wrapped
+    return decorator
+
+
+def serve(view, scopes, request, *args, **kwargs):
+    names = scopes(**kwargs)
+    if names is None:
+        return view(request, *args, **kwargs)
+    version = generations(*names)
+    digest = hashlib.md5(
+        f'{request.get_full_path()}|{version}'.encode()
+    ).hexdigest()
+    etag = quote_etag(digest)
+    anonymous = not request.user.is_authenticated
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if anonymous and etag in weak_etags(if_none_match):
+        response = HttpResponseNotModified()
+    else:
+        # Отсутствующую страницу рендерит один запрос, остальные
+        # ждут его результат (core.stampede).
+        rendered = []
+
+        def render():
+            rendered.append(True)
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(stale_key(request), response, STALE_TIMEOUT)
+            return response
+
+        response = get_or_compute(
+            page_key(digest), render, PAGE_TIMEOUT,
+            keep=lambda response: response.status_code == 200
+        )
+        if not rendered:
+            response.content = fill(
+                request, response.content.decode(response.charset)
+            )
+        elif response.status_code != 200:
+            return response
+    if anonymous:
+        # Все анонимы получают одни и те же байты.
+        mark_shared(response)
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+    else:
+        patch_cache_control(response, private=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def serve_stale(request, response):
+    try:
+        content = fill(request, response.content.decode(response.charset))
+    except DatabaseError:
+        # Персональные куски тоже не из чего собрать: показываем
+        # страницу такой, какой её видит аноним.
+        request.user = AnonymousUser()
+        content = fill(request, response.content.decode(response.charset))
+    response.content = content
+    response['Warning'] = '110 - "Response is Stale"'
+    patch_cache_control(response, no_cache=True, private=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def index_scopes():
+    return ['index']
+
+
+def group_scopes(slug):
+    pk = Group.objects.filter(slug=slug).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return [f'group:{pk}', 'authors']
+
+
+def profile_scopes(username):
+    pk = User.objects.filter(
+        username=username
+    ).values_list('pk', flat=True).first()
+    if pk is None:
+        return None
+    return [f'profile:{pk}', 'groups']
+
+
+def detail_scopes(post_id):
+    author_id = Post.objects.filter(
+        pk=post_id
+    ).values_list('author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return [f'post:{post_id}', f'profile:{author_id}', 'authors', 'groups']
@@ -0,0 +1,86 @@
+import re
+from urllib.parse import quote, unquote
+
+from django.template.loader import render_to_string
+
+from .forms import CommentForm
+from .models import Follow
+
+# Персональные куски страницы (шапка, кнопки подписки, форма
+# комментария) выводятся между маркерами. Остальная страница одна
+# на всех и кэшируется целиком, а маркеры при отдаче заполняются
+# заново для текущего пользователя.
+MARKER = re.compile(r'<!--personal:([^>]*)-->.*?<!--/personal-->', re.S)
+
+SECTIONS = {}
+
+
+def section(name, template):
+    """Регистрирует персональный кусок: функция получает request
+    и строковые аргументы из маркера и возвращает контекст шаблона."""
+    def register(func):
+        SECTIONS[name] = (template, func)
+        return func
+    return register
+
+
+def render_section(request, name, *args):
+    template, get_context = SECTIONS[name]
+    args = [str(arg) for arg in args]
+    body = render_to_string(template, get_context(request, *args), request)
+    marker = ':'.join([name] + [quote(arg, safe='') for arg in args])
+    return f'<!--personal:{marker}-->{body}<!--/personal-->'
+
+
+def fill(request, content: str) -> str:
+    """Перерисовывает персональные куски страницы для request.user."""
+    def replace(match):
+        name, *args = match.group(1).split(':')
+        return render_section(request, name, *map(unquote, args))
+    return MARKER.sub(replace, content)
+
+
+@section('header', 'includes/header.html')
+def header(request):
+    return {}
+
+
+@section('switcher', 'posts/includes/switcher.html')
+def switcher(request):
+    return {}
+
+
+@section('follow_author', 'posts/includes/follow_author.html')
+def follow_author(request, username):
+    user = request.user
+    return {
+        'username': username,
+        'is_author': user.username == username,
+        'following': user.is_authenticated and Follow.objects.filter(
+            user=user, author__username=username
+        ).exists(),
+    }
+
+
+@section('follow_group', 'posts/includes/follow_group.html')
+def follow_group(request, slug):
+    user = request.user
+    return {
+        'slug': slug,
+        'following': user.is_authenticated and Follow.objects.filter(
+            user=user, group__slug=slug
+        ).exists(),
+    }
+
+
+@section('edit_post', 'posts/includes/edit_post.html')
+def edit_post(request, post_id, author_id):
+    return {
+        'post_id': post_id,
+        'is_author': str(request.user.pk) == author_id,
+    }
+
+
+@section('comment_form', 'posts/includes/comment_form.html')
+def comment_form(request, post_id):
+    return {'post_id': post_id, 'form': CommentForm()}
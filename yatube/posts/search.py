@@ -0,0 +1,133 @@
+import re
+
+from django.db import connection, connections
+from django.db.models.expressions import RawSQL
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Post
+
+FTS_TABLE = 'posts_post_fts'
+SNIPPET_TOKENS = 16
+MARK_START, MARK_END = '\x02', '\x03'
+
+# Индекс FTS5 хранит только токены, сам текст берётся из posts_post.
+# Триггеры создаются после каждой миграции: пересборка таблицы в SQLite
+# (ALTER через копию) удаляет триггеры старой таблицы.
+TRIGGERS = (
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai
+        AFTER INSERT ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad
+        AFTER DELETE ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+        END''',
+    f'''CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au
+        AFTER UPDATE OF text ON posts_post BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, text)
+            VALUES ('delete', old.id, old.text);
+            INSERT INTO {FTS_TABLE}(rowid, text) VALUES (new.id, new.text);
+        END''',
+)
+
+
+def uses_fts(db=connection):
+    return db.vendor == 'sqlite'
+
+
+def install_triggers(sender, using='default', **kwargs):
+    db = connections[using]
+    if not uses_fts(db):
+        return
+    with db.cursor() as cursor:
+        if FTS_TABLE not in db.introspection.table_names(cursor):
+            return
+        for trigger in TRIGGERS:
+            cursor.execute(trigger)
+
+
+def match_expression(query):
+    """Запрос пользователя -> безопасное выражение FTS5: все слова
+    обязательны, последнее ищется по префиксу."""
+    words = re.findall(r'\w+', query)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def matching_ids(query):
+    """Подзапрос id постов, подходящих под запрос, для filter(pk__in=)."""
+    return RawSQL(
+        f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+        (match_expression(query),)
+    )
+
+
+class SearchResults:
+    """Результаты поиска, упорядоченные по релевантности (bm25).
+
+    Понимает count() и срезы, поэтому отдаётся в Paginator как есть.
+    """
+
+    def __init__(self, query):
+        self.match = match_expression(query)
+        self.query = query
+
+    def count(self):
+        if self.match is None:
+            return 0
+        if not uses_fts():
+            return Post.objects.filter(text__icontains=self.query).count()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                [self.match]
+            )
+            return cursor.fetchone()[0]
+
+    def _ranked(self, limit, offset):
+        if not uses_fts():
+            posts = Post.objects.filter(
+                text__icontains=self.query
+            ).values_list('pk', 'text')[offset:offset + limit]
+            return [(pk, text) for pk, text in posts]
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'''SELECT rowid,
+                           snippet({FTS_TABLE}, 0, %s, %s, '…', %s)
+                    FROM {FTS_TABLE}
+                    WHERE {FTS_TABLE} MATCH %s
+                    ORDER BY rank
+                    LIMIT %s OFFSET %s''',
+                [MARK_START, MARK_END, SNIPPET_TOKENS, self.match,
+                 limit, offset]
+            )
+            return cursor.fetchall()
+
+    def __getitem__(self, item):
+        if self.match is None:
+            return []
+        offset = item.start or 0
+        rows = self._ranked(item.stop - offset, offset)
+        posts = Post.objects.select_related('author', 'group').in_bulk(
+            [pk for pk, _ in rows]
+        )
+        results = []
+        for pk, snippet in rows:
+            if pk in posts:
+                post = posts[pk]
+                post.snippet = highlight(snippet)
+                results.append(post)
+        return results
@@ -0,0 +1,148 @@
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from .autocomplete import suggestions
+from .counters import bump_group, bump_post, bump_user
+from .feeds import (
+    backfill, demoted, fan_out, is_celebrity, promoted, prune
+)
+from .fragments import bump, post_scopes
+from .models import Comment, Follow, Group, Post, User, UserStats
+from .thumbnails import queue as queue_thumbnails
+from .utils import invalidate_counts
+
+
+def post_feeds(*group_ids):
+    """Ленты, число постов в которых меняет пост. Ленты подписчиков
+    сюда не входят: их число постов привязано к поколениям авторов
+    и групп (MergedFeed.count_key), которые сдвигает bump(). Профиль
+    тоже: его число постов берётся из UserStats."""
+    feeds = ['index']
+    feeds += [f'group:{group_id}' for group_id in group_ids if group_id]
+    return feeds
+
+
+def shown_name(user):
+    """Поля пользователя, которые выводятся в карточке поста."""
+    return user.username, user.first_name, user.last_name
+
+
+@receiver(post_init, sender=User)
+def remember_username(sender, instance, **kwargs):
+    instance._initial_username = instance.username
+    instance._initial_name = shown_name(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, **kwargs):
+    if created:
+        UserStats.objects.get_or_create(user=instance)
+    if created or instance._initial_username != instance.username:
+        suggestions.changed(
+            add=suggestions.user_entry(instance.pk, instance.username),
+            remove=('user', instance.pk)
+        )
+    if not created and instance._initial_name != shown_name(instance):
+        bump('index', 'authors', f'profile:{instance.pk}')
+    instance._initial_username = instance.username
+    instance._initial_name = shown_name(instance)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    suggestions.changed(remove=('user', instance.pk))
+    bump('index', 'authors', f'profile:{instance.pk}')
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, **kwargs):
+    suggestions.changed(
+        add=suggestions.group_entry(
+            instance.pk, instance.title, instance.slug
+        ),
+        remove=('group', instance.pk)
+    )
+    bump('index', 'groups', f'group:{instance.pk}')
+
+
+@receiver(post_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    suggestions.changed(remove=('group', instance.pk))
+    bump('index', 'groups', f'group:{instance.pk}')
+
+
+@receiver(post_init, sender=Post)
+def remember_group(sender, instance, **kwargs):
+    instance._initial_group_id = instance.group_id
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_user(instance.author_id, posts_count=1)
+        bump_group(instance.group_id, 1)
+        fan_out(instance)
+        invalidate_counts(*post_feeds(instance.group_id))
+    elif instance._initial_group_id != instance.group_id:
+        bump_group(instance._initial_group_id, -1)
+        bump_group(instance.group_id, 1)
+        invalidate_counts(*post_feeds(
+            instance._initial_group_id, instance.group_id
+        ))
+    bump(f'post:{instance.pk}', *post_scopes(
+        instance.author_id, instance._initial_group_id, instance.group_id
+    ))
+    instance._initial_group_id = instance.group_id
+    if instance.image:
+        queue_thumbnails(instance.image.name)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_user(instance.author_id, posts_count=-1)
+    bump_group(instance._initial_group_id, -1)
+    invalidate_counts(*post_feeds(
+        instance.group_id, instance._initial_group_id
+    ))
+    bump(f'post:{instance.pk}', *post_scopes(
+        instance.author_id, instance.group_id, instance._initial_group_id
+    ))
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_post(instance.post_id, 1)
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    bump_post(instance.post_id, -1)
+    bump(f'post:{instance.post_id}')
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created and instance.author_id:
+        celebrity = is_celebrity(instance.author_id)
+        bump_user(instance.author_id, followers_count=1)
+        bump_user(instance.user_id, following_count=1)
+        if not celebrity and is_celebrity(instance.author_id):
+            promoted(instance.author_id)
+        backfill(instance.user_id, instance.author_id)
+        bump(f'profile:{instance.author_id}', f'profile:{instance.user_id}')
+    bump(f'follow:{instance.user_id}')
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    if instance.author_id:
+        celebrity = is_celebrity(instance.author_id)
+        bump_user(instance.author_id, followers_count=-1)
+        bump_user(instance.user_id, following_count=-1)
+        prune(instance.user_id, instance.author_id)
+        if celebrity and not is_celebrity(instance.author_id):
+            demoted(instance.author_id)
+        bump(f'profile:{instance.author_id}', f'profile:{instance.user_id}')
+    bump(f'follow:{instance.user_id}')
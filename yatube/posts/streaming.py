@@ -0,0 +1,54 @@
+import secrets
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.shortcuts import render
+from django.template import loader
+
+# Ключ контекста, по которому {% stream %} узнаёт о потоковом рендере.
+STREAM_KEY = 'posts.streaming'
+
+
+class Deferred:
+    """Блоки {% stream %}, отложенные до отправки начала страницы.
+
+    Вместо блока в HTML остаётся метка-комментарий со случайной
+    частью: пользовательский текст экранирован и совпасть с ней
+    не может.
+    """
+
+    def __init__(self):
+        self.nonce = secrets.token_hex(8)
+        self.blocks = []
+
+    def marker(self, index):
+        return f'<!--stream:{self.nonce}:{index}-->'
+
+    def add(self, parts):
+        """parts() — генератор кусков HTML блока."""
+        self.blocks.append(parts)
+        return self.marker(len(self.blocks) - 1)
+
+    def chunks(self, content):
+        for index, parts in enumerate(self.blocks):
+            head, _, content = content.partition(self.marker(index))
+            yield head
+            yield from parts()
+        yield content
+
+
+def stream(request, template_name, context=None):
+    """Как render(), но страница уходит клиенту частями.
+
+    Шаблон рендерится сразу, кроме блоков {% stream %}: всё до
+    первого из них (<head>, шапка) отправляется немедленно, затем
+    блоки дорисовываются по очереди, а циклы {% for_cards %} в них
+    отдают пост за постом. Строки страниц (posts.utils.LazyRows)
+    читаются из базы только при рендере своего блока.
+    """
+    if not getattr(settings, 'STREAM_PAGES', True):
+        return render(request, template_name, context)
+    deferred = Deferred()
+    context = {**(context or {}), STREAM_KEY: deferred}
+    content = loader.render_to_string(template_name, context, request)
+    return StreamingHttpResponse(deferred.chunks(content))
@@ -0,0 +1,26 @@
+from django import template
+
+from ..utils import page_window
+
+register = template.Library()
+
+PAGE_PARAMS = ('page', 'after', 'before')
+
+
+@register.inclusion_tag('posts/includes/paginator.html', takes_context=True)
+def paginator(context, page_obj):
+    window = ()
+    if page_obj.number is not None:
+        # Номера дальше last_number не показываются: туда ведут
+        # только курсоры (см. posts.utils.get_page_obj).
+        last = getattr(page_obj, 'last_number', page_obj.paginator.num_pages)
+        window = page_window(page_obj.number, last)
+    query = context['request'].GET.copy()
+    for param in PAGE_PARAMS:
+        query.pop(param, None)
+    prefix = query.urlencode() + '&' if query else ''
+    return {
+        'page_obj': page_obj,
+        'page_window': window,
+        'query_prefix': prefix,
+    }
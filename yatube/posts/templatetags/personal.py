@@ -0,0 +1,11 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from .. import personal as sections
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def personal(context, name, *args):
+    return mark_safe(sections.render_section(context['request'], name, *args))
@@ -0,0 +1,39 @@
+from django import template
+
+from ..streaming import STREAM_KEY
+
+register = template.Library()
+
+
+def iter_render(nodelist, context):
+    for node in nodelist:
+        if hasattr(node, 'iter_render'):
+            yield from node.iter_render(context)
+        else:
+            yield node.render_annotated(context)
+
+
+class StreamNode(template.Node):
+    def __init__(self, nodelist):
+        self.nodelist = nodelist
+
+    def render(self, context):
+        deferred = context.get(STREAM_KEY)
+        if deferred is None:
+            return self.nodelist.render(context)
+        # Внешний шаблон к моменту рендера блока уже закончит работу
+        # со своим контекстом: блоку нужен свой снимок.
+        values = context.flatten()
+        del values[STREAM_KEY]
+        snapshot = context.new(values)
+        return deferred.add(lambda: iter_render(self.nodelist, snapshot))
+
+
+@register.tag
+def stream(parser, token):
+    """{% stream %}...{% endstream %}: при рендере через
+    posts.streaming.stream() блок отдаётся после начала страницы,
+    в остальных случаях — как обычно, на месте."""
+    nodelist = parser.parse(('endstream',))
+    parser.delete_first_token()
+    return StreamNode(nodelist)
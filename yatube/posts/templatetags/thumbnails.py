@@ -0,0 +1,15 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from .. import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail_img(image, geometry, css_class='', **options):
+    """{% thumbnail_img post.image "960x339" crop="center" %}: <img>
+    готовой миниатюры или заглушка, пока её создаёт фоновый пул."""
+    return mark_safe(
+        thumbnails.image_tag(image, geometry, css_class, **options)
+    )
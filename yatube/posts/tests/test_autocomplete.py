@@ -0,0 +1,106 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from ..autocomplete import (
+    VERSION_KEY, PrefixIndex, Suggestions, suggestions
+)
+from ..models import Group
+
+User = get_user_model()
+
+
+class PrefixIndexTests(TestCase):
+    def test_prefix_search(self):
+        index = PrefixIndex()
+        index.add(1, ('Кошки', 'cats'), 'кошки')
+        index.add(2, ('Коты',), 'коты')
+        index.add(3, ('Собаки',), 'собаки')
+        self.assertEqual(index.search('ко'), ['коты', 'кошки'])
+        self.assertEqual(index.search('CA'), ['кошки'])
+        self.assertEqual(index.search('ко', limit=1), ['коты'])
+        index.remove(1)
+        self.assertEqual(index.search('ко'), ['коты'])
+        self.assertEqual(index.search('ca'), [])
+
+
+class AutocompleteViewTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Nameless')
+        cls.group = Group.objects.create(
+            title='Test-group',
+            slug='t-group',
+            description='test-description'
+        )
+
+    def setUp(self):
+        suggestions.index = None
+
+    def labels(self, query):
+        response = self.client.get(reverse('posts:autocomplete'), {'q': query})
+        return [item['label'] for item in response.json()['results']]
+
+    def test_suggests_users_and_groups_without_queries(self):
+        self.labels('')
+        self.labels('n')
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                reverse('posts:autocomplete'), {'q': 'name'}
+            )
+        self.assertEqual(response.json()['results'], [{
+            'type': 'user',
+            'label': 'Nameless',
+            'url': reverse('posts:profile', args=('Nameless',)),
+        }])
+        self.assertEqual(self.labels('t-gr'), ['Test-group'])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.labels('n')
+        user = User.objects.get(pk=self.user.pk)
+        user.username = 'Renamed'
+        user.save()
+        group = Group.objects.create(title='Кошки', slug='cats')
+        self.assertEqual(self.labels('name'), [])
+        self.assertEqual(self.labels('ren'), ['Renamed'])
+        self.assertEqual(self.labels('кош'), ['Кошки'])
+        group.delete()
+        self.assertEqual(self.labels('кош'), [])
+
+    def test_other_process_applies_journal(self):
+        # Индекс другого процесса: изменения до него не доходят
+        # напрямую, только через общий кэш.
+        other = Suggestions()
+        other.current()
+        User.objects.create_user(username='Newcomer')
+        Group.objects.filter(pk=self.group.pk).delete()
+        other.checked = 0
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                [item['label'] for item in other.search('new')],
+                ['Newcomer']
+            )
+            self.assertEqual(other.search('t-gr'), [])
+
+        User.objects.create_user(username='Latecomer')
+        cache.delete(other.journal_key(other.version + 1))
+        other.checked = 0
+        with self.assertNumQueries(2):
+            # Журнал с дырой: индекс строится заново.
+            self.assertEqual(len(other.search('late')), 1)
+
+    def test_evicted_version_does_not_reuse_numbers(self):
+        cache.clear()
+        other = Suggestions()
+        User.objects.create_user(username='First')
+        other.current()
+        cache.delete(VERSION_KEY)
+        User.objects.create_user(username='Second')
+        User.objects.create_user(username='Secondary')
+        other.checked = 0
+        self.assertEqual(
+            [item['label'] for item in other.search('second')],
+            ['Second', 'Secondary']
+        )
@@ -0,0 +1,76 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import Paginator
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+
+from ..cards import card_key, card_rows, render_cards
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class CardRendererTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(
+            username='Nameless', first_name='<Без>', last_name='Имени & Co'
+        )
+        cls.plain = Post.objects.create(
+            text='Текст с <b>тегами</b> & "кавычками"', author=cls.author
+        )
+        cls.with_image = Post.objects.create(
+            text='С картинкой',
+            author=cls.author,
+            image=SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_same_html_as_template(self):
+        for post in (self.plain, self.with_image):
+            with self.subTest(post=post.pk):
+                expected = render_to_string(
+                    'posts/post-display.html', {'post': post}
+                )
+                cache.clear()
+                self.assertEqual(render_cards([post]), [expected])
+
+    def test_cards_share_fragments_with_template(self):
+        cache.set(card_key(self.plain), 'из кэша шаблона')
+        self.assertEqual(render_cards([self.plain]), ['\nиз кэша шаблона\n'])
+        render_cards([self.with_image])
+        self.assertIn('<article>', cache.get(card_key(self.with_image)))
+
+    def test_rows_read_once(self):
+        posts = Post.objects.select_related('author').order_by('pk')
+        page = Paginator(posts, 10).page(1)
+        # Строки страницы и поиск миниатюры в хранилище sorl.
+        with self.assertNumQueries(2):
+            rows = list(card_rows(page, size=1))
+            self.assertEqual(len(page), 2)
+        self.assertEqual([post for post, _ in rows], list(posts))
@@ -0,0 +1,117 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..fragments import bump
+from ..models import Comment, Follow, Group, Post, UserStats
+
+User = get_user_model()
+
+
+class CounterTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Nameless')
+        cls.reader = User.objects.create_user(username='Fololo')
+        cls.group = Group.objects.create(
+            title='Test-group',
+            slug='t-group',
+            description='test-description'
+        )
+
+    def stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_counters_follow_creates_and_deletes(self):
+        post = Post.objects.create(
+            text='Тестовый текст', author=self.author, group=self.group
+        )
+        Comment.objects.create(post=post, author=self.reader, text='Ого')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 1)
+
+        follow.delete()
+        post.delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 0)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+        self.assertEqual(self.group.posts_count, 0)
+
+    def test_reconcile_counters_fixes_drift(self):
+        post = Post.objects.create(
+            text='Тестовый текст', author=self.author, group=self.group
+        )
+        UserStats.objects.filter(user=self.author).update(posts_count=42)
+        Group.objects.filter(pk=self.group.pk).update(posts_count=0)
+        Post.objects.filter(pk=post.pk).update(comments_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+
+        call_command('reconcile_counters', chunk_size=1, stdout=StringIO())
+
+        post.refresh_from_db()
+        self.group.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.group.posts_count, 1)
+        self.assertEqual(post.comments_count, 0)
+        self.assertTrue(UserStats.objects.filter(user=self.reader).exists())
+
+    def test_profile_and_detail_run_no_aggregates(self):
+        cache.clear()
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        urls = (
+            reverse('posts:profile', kwargs={'username': 'Nameless'}),
+            reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+        )
+        for url in urls:
+            self.client.get(url)
+            with self.subTest(url=url):
+                # Страница рендерится заново, число постов — из кэша.
+                bump(f'profile:{self.author.pk}')
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                self.assertFalse([
+                    query['sql'] for query in queries
+                    if 'COUNT(' in query['sql']
+                ])
+
+    def test_profile_runs_no_aggregates_on_cold_cache(self):
+        Post.objects.create(text='Тестовый текст', author=self.author)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('posts:profile', kwargs={'username': 'Nameless'})
+            )
+        self.assertEqual(response.context['page_obj'].paginator.count, 1)
+        self.assertFalse([
+            query['sql'] for query in queries if 'COUNT(' in query['sql']
+        ])
+
+    def test_missing_stats_are_not_written_on_read(self):
+        post = Post.objects.create(text='Тестовый текст', author=self.author)
+        UserStats.objects.filter(user=self.author).delete()
+        cache.clear()
+        with self.settings(READ_ONLY=True):
+            for url in (
+                reverse('posts:profile', kwargs={'username': 'Nameless'}),
+                reverse('posts:post_detail', kwargs={'post_id': post.pk}),
+            ):
+                with self.subTest(url=url):
+                    response = self.client.get(url)
+                    self.assertEqual(response.status_code, 200)
+                    self.assertEqual(response.context['author_posts_count'], 1)
+        self.assertFalse(UserStats.objects.filter(user=self.author).exists())
@@ -0,0 +1,163 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from .. import feeds
+from ..models import FeedEntry, Follow, Group, Post
+from ..utils import MAX_POST_DISPLAYED, encode_cursor
+
+User = get_user_model()
+
+
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Nameless')
+        cls.follower = User.objects.create_user(username='Fololo')
+        cls.group = Group.objects.create(
+            title='Test-group',
+            slug='t-group',
+            description='test-description'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def feed(self, query=''):
+        response = self.follower_client.get(
+            reverse('posts:follow_index') + query
+        )
+        return response.context['page_obj']
+
+    def test_fan_out_backfill_and_prune(self):
+        old_post = Post.objects.create(text='До подписки', author=self.author)
+        Follow.objects.create(user=self.follower, author=self.author)
+        new_post = Post.objects.create(
+            text='После подписки', author=self.author
+        )
+        entries = FeedEntry.objects.filter(user=self.follower)
+        self.assertEqual(
+            set(entries.values_list('post', flat=True)),
+            {old_post.pk, new_post.pk}
+        )
+        self.assertEqual(list(self.feed()), [new_post, old_post])
+
+        Follow.objects.filter(user=self.follower, author=self.author).delete()
+        self.assertFalse(entries.exists())
+        self.assertEqual(len(self.feed()), 0)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_celebrity_posts_merged_at_read_time(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        posts = [
+            Post.objects.create(text=f'Пост {i}', author=self.author)
+            for i in range(MAX_POST_DISPLAYED + 3)
+        ]
+        self.assertFalse(FeedEntry.objects.exists())
+
+        page_obj = self.feed()
+        self.assertEqual(page_obj.paginator.count, len(posts))
+        self.assertEqual(list(page_obj), posts[::-1][:MAX_POST_DISPLAYED])
+        self.assertEqual(
+            list(self.feed('?page=2')), posts[::-1][MAX_POST_DISPLAYED:]
+        )
+        after = encode_cursor(page_obj[-1])
+        self.assertEqual(
+            list(self.feed('?after=' + after)),
+            posts[::-1][MAX_POST_DISPLAYED:]
+        )
+
+    def test_feed_does_not_duplicate_fanned_out_celebrity_posts(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        post = Post.objects.create(text='Разложенный пост', author=self.author)
+        with self.settings(FEED_FANOUT_THRESHOLD=1):
+            cache.clear()
+            page_obj = self.feed()
+        self.assertEqual(list(page_obj), [post])
+        self.assertEqual(page_obj.paginator.count, 1)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=3, FEED_DEMOTE_THRESHOLD=2)
+    def test_posts_kept_when_author_is_no_longer_celebrity(self):
+        others = [
+            User.objects.create_user(username=f'Other{i}') for i in range(2)
+        ]
+        Follow.objects.create(user=self.follower, author=self.author)
+        for other in others:
+            Follow.objects.create(user=other, author=self.author)
+        post = Post.objects.create(text='Пост звезды', author=self.author)
+        self.assertFalse(FeedEntry.objects.exists())
+
+        with mock.patch('posts.feeds.transaction.on_commit') as on_commit:
+            Follow.objects.filter(user=others[0]).delete()
+        # Ниже порога раскладки, но не ниже FEED_DEMOTE_THRESHOLD:
+        # пост ещё подмешивается при чтении, пока идёт раскладка.
+        self.assertFalse(FeedEntry.objects.exists())
+        self.assertEqual(list(self.feed()), [post])
+        with mock.patch.object(feeds.refills, 'submit', feeds.refill):
+            on_commit.call_args[0][0]()
+        self.assertTrue(
+            FeedEntry.objects.filter(user=self.follower, post=post).exists()
+        )
+
+        Follow.objects.filter(user=others[1]).delete()
+        page_obj = self.feed()
+        self.assertEqual(list(page_obj), [post])
+        self.assertEqual(page_obj.paginator.count, 1)
+
+    def test_feed_count_follows_posts_without_per_follower_keys(self):
+        Follow.objects.create(user=self.follower, author=self.author)
+        Post.objects.create(text='Первый', author=self.author)
+        self.assertEqual(self.feed().paginator.count, 1)
+        with mock.patch('posts.signals.invalidate_counts') as invalidate:
+            Post.objects.create(text='Второй', author=self.author)
+        feeds = [
+            feed for call in invalidate.call_args_list for feed in call[0]
+        ]
+        self.assertFalse([
+            feed for feed in feeds if feed.startswith('follow:')
+        ])
+        self.assertEqual(self.feed().paginator.count, 2)
+
+    def test_group_follow_and_unfollow(self):
+        self.follower_client.get(
+            reverse('posts:group_follow', kwargs={'slug': self.group.slug})
+        )
+        self.assertTrue(
+            Follow.objects.filter(user=self.follower, group=self.group)
+            .exists()
+        )
+        response = self.follower_client.get(
+            reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        )
+        self.assertContains(response, 'Отписаться')
+        self.follower_client.get(
+            reverse('posts:group_unfollow', kwargs={'slug': self.group.slug})
+        )
+        self.assertFalse(
+            Follow.objects.filter(user=self.follower, group=self.group)
+            .exists()
+        )
+
+    def test_timeline_merges_authors_and_groups(self):
+        stranger = User.objects.create_user(username='Stranger')
+        Follow.objects.create(user=self.follower, author=self.author)
+        Follow.objects.create(user=self.follower, group=self.group)
+        posts = [
+            Post.objects.create(text='Автор', author=self.author),
+            Post.objects.create(
+                text='Группа', author=stranger, group=self.group
+            ),
+            Post.objects.create(
+                text='Автор в группе', author=self.author, group=self.group
+            ),
+            Post.objects.create(text='Чужой пост', author=stranger),
+        ]
+        page_obj = self.feed()
+        self.assertEqual(list(page_obj), posts[2::-1])
+        self.assertEqual(page_obj.paginator.count, 3)
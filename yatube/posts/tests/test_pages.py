@@ -0,0 +1,159 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import (
+    TestCase, TransactionTestCase, Client, override_settings
+)
+from django.urls import reverse
+
+from ..models import Comment, Group, Post
+
+User = get_user_model()
+
+
+class SharedPageCacheTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Nameless')
+        cls.group = Group.objects.create(
+            title='Test-group',
+            slug='t-group',
+            description='test-description'
+        )
+        cls.post = Post.objects.create(
+            text='Тестовый текст', author=cls.author, group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.author)
+
+    def urls(self):
+        return (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'Nameless'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def test_cached_page_renders_without_queries(self):
+        self.client.get(reverse('posts:index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, 'Тестовый текст')
+
+    def test_matching_etag_gets_not_modified(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_writes_change_etag(self):
+        etags = {url: self.client.get(url)['ETag'] for url in self.urls()}
+        Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group
+        )
+        Comment.objects.create(post=self.post, author=self.author, text='Ого')
+        for url, etag in etags.items():
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotEqual(response['ETag'], etag)
+
+    def test_query_string_is_part_of_key(self):
+        url = reverse('posts:index')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'],
+            self.client.get(url + '?page=2')['ETag']
+        )
+
+    def test_authorized_pages_share_cache_with_own_fragments(self):
+        reader = User.objects.create_user(username='Fololo')
+        reader_client = Client()
+        reader_client.force_login(reader)
+        url = reverse('posts:profile', kwargs={'username': 'Nameless'})
+        self.authorized_client.get(url)
+        response = reader_client.get(url)
+        self.assertTemplateNotUsed(response, 'posts/profile.html')
+        self.assertFalse(response.has_header('ETag'))
+        self.assertContains(response, 'Пользователь: Fololo')
+        self.assertNotContains(response, 'Пользователь: Nameless')
+        self.assertContains(response, 'Подписаться')
+        response = self.client.get(url)
+        self.assertContains(response, 'Войти')
+        self.assertContains(response, 'Подписаться')
+
+    def test_cached_detail_has_personal_comment_form(self):
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        self.client.get(url)
+        response = self.authorized_client.get(url)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertContains(response, 'csrfmiddlewaretoken')
+        self.assertContains(response, 'Редактировать пост')
+
+    def test_missing_pages_are_not_cached(self):
+        response = self.client.get(
+            reverse('posts:profile', kwargs={'username': 'Nobody'})
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertFalse(response.has_header('ETag'))
+
+    def test_stale_page_when_database_is_too_slow(self):
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.client.get(url)
+        Post.objects.create(
+            text='Новый пост', author=self.author, group=self.group
+        )
+        with override_settings(PAGE_LATENCY_BUDGET=0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Stale', response['Warning'])
+        self.assertContains(response, 'Тестовый текст')
+        self.assertNotContains(response, 'Новый пост')
+        self.assertFalse(response.has_header('ETag'))
+        response = self.client.get(url)
+        self.assertFalse(response.has_header('Warning'))
+        self.assertContains(response, 'Новый пост')
+
+    def test_no_stale_copy_raises(self):
+        with override_settings(PAGE_LATENCY_BUDGET=0):
+            with self.assertRaises(OperationalError):
+                self.client.get(reverse('posts:index'))
+
+
+class WarmCacheTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        author = User.objects.create_user(username='Nameless')
+        self.group = Group.objects.create(
+            title='Test-group',
+            slug='t-group',
+            description='test-description'
+        )
+        Post.objects.create(
+            text='Тестовый текст', author=author, group=self.group
+        )
+
+    def test_warm_cache_fills_page_cache(self):
+        out = StringIO()
+        call_command('warm_cache', pages=2, concurrency=2, stdout=out)
+        self.assertIn('Прогрето страниц: 4, с ошибкой: 0', out.getvalue())
+        for url, template in (
+            (reverse('posts:index'), 'posts/index.html'),
+            (reverse('posts:index') + '?page=2', 'posts/index.html'),
+            (reverse('posts:group_list', kwargs={'slug': 't-group'}),
+             'posts/group_list.html'),
+            (reverse('posts:profile', kwargs={'username': 'Nameless'}),
+             'posts/profile.html'),
+        ):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTemplateNotUsed(response, template)
@@ -0,0 +1,102 @@
+import re
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from ..utils import MAX_POST_DISPLAYED, encode_cursor
+
+User = get_user_model()
+
+FULL_SCAN = re.compile(r'^SCAN \S+$')
+# Общее число постов на главной берётся из кэша, а не считается
+# при каждом запросе; полный проход по индексу тут ожидаем.
+CACHED_TOTAL_COUNT = 'SELECT COUNT(*) AS "__count" FROM "posts_post"'
+
+
+@skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN из SQLite')
+class QueryPlanTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Nameless')
+        cls.reader = User.objects.create_user(username='Fololo')
+        cls.group = Group.objects.create(
+            title='Test-group',
+            slug='t-group',
+            description='test-description'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        Follow.objects.create(user=cls.reader, group=cls.group)
+        for i in range(MAX_POST_DISPLAYED + 3):
+            cls.post = Post.objects.create(
+                text=f'Тестовый текст {i}',
+                author=cls.author,
+                group=cls.group,
+            )
+        Comment.objects.create(post=cls.post, author=cls.reader, text='Ого')
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexedQueries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url)
+            # Ленты отдаются потоком: запросы страницы выполняются,
+            # только пока читается тело ответа.
+            if response.streaming:
+                b''.join(response.streaming_content)
+        selects = [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT')
+            and query['sql'] != CACHED_TOTAL_COUNT
+        ]
+        self.assertTrue(selects)
+        for sql in selects:
+            for step in self.plan(sql):
+                with self.subTest(url=url, sql=sql, step=step):
+                    self.assertNotRegex(step, FULL_SCAN)
+                    self.assertNotIn('TEMP B-TREE', step)
+
+    def feed_urls(self):
+        after = '?after=' + encode_cursor(self.post)
+        before = '?before=' + encode_cursor(self.post)
+        for url in (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'Nameless'}),
+            reverse('posts:follow_index'),
+        ):
+            yield url
+            yield url + '?page=2'
+            yield url + after
+            yield url + before
+
+    def test_feed_views_use_indexes(self):
+        for url in self.feed_urls():
+            self.assertIndexedQueries(url)
+
+    @override_settings(FEED_FANOUT_THRESHOLD=1)
+    def test_follow_feed_with_celebrities_uses_indexes(self):
+        self.assertIndexedQueries(reverse('posts:follow_index'))
+        self.assertIndexedQueries(
+            reverse('posts:follow_index') + '?after='
+            + encode_cursor(self.post)
+        )
+
+    def test_post_detail_uses_indexes(self):
+        self.assertIndexedQueries(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
@@ -0,0 +1,71 @@
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, Client
+from django.urls import reverse
+
+from ..models import Post
+from ..utils import MAX_POST_DISPLAYED
+
+User = get_user_model()
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Индекс FTS5 есть только в SQLite')
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Nameless')
+        cls.post = Post.objects.create(
+            text='Кот <b>сидит</b> на окне и смотрит на птиц',
+            author=cls.author,
+        )
+        Post.objects.create(text='Собака спит на диване', author=cls.author)
+
+    def search(self, query, client=None):
+        response = (client or self.client).get(
+            reverse('posts:search'), {'q': query}
+        )
+        return response.context['page_obj']
+
+    def test_search_finds_and_highlights(self):
+        page_obj = self.search('окне')
+        self.assertEqual(list(page_obj), [self.post])
+        self.assertIn('<mark>окне</mark>', page_obj[0].snippet)
+        self.assertIn('&lt;b&gt;', page_obj[0].snippet)
+
+    def test_search_by_prefix_of_last_word(self):
+        self.assertEqual(list(self.search('смотрит пти')), [self.post])
+
+    def test_index_follows_edits_and_deletes(self):
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Кот ушёл гулять'
+        post.save()
+        self.assertEqual(len(self.search('окне')), 0)
+        self.assertEqual(list(self.search('гулять')), [post])
+        post.delete()
+        self.assertEqual(len(self.search('гулять')), 0)
+
+    def test_query_syntax_is_not_passed_to_fts(self):
+        for query in ('"', 'NEAR(', '*', ''):
+            with self.subTest(query=query):
+                self.assertEqual(len(self.search(query)), 0)
+
+    def test_paginator_keeps_query(self):
+        for i in range(MAX_POST_DISPLAYED + 1):
+            Post.objects.create(text=f'Дневник {i}', author=self.author)
+        response = self.client.get(reverse('posts:search'), {'q': 'дневник'})
+        self.assertContains(response, 'href="?q=%D0%B4%D0%BD%D0%B5')
+        self.assertEqual(len(response.context['page_obj']), MAX_POST_DISPLAYED)
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        client = Client()
+        client.force_login(admin)
+        response = client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'собака'}
+        )
+        self.assertEqual(response.context['cl'].result_count, 1)
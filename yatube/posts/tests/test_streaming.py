@@ -0,0 +1,61 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.paginator import Page
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Follow, Post
+
+User = get_user_model()
+
+
+class StreamingTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Nameless')
+        cls.follower = User.objects.create_user(username='Fololo')
+        Follow.objects.create(user=cls.follower, author=cls.author)
+        for i in range(3):
+            Post.objects.create(text=f'Пост {i}', author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.follower)
+
+    def test_head_is_sent_before_posts(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        self.assertTrue(response.streaming)
+        chunks = [chunk.decode() for chunk in response.streaming_content]
+        self.assertIn('</head>', chunks[0])
+        self.assertNotIn('<article>', chunks[0])
+        # По куску на каждый пост, плюс начало и конец страницы.
+        self.assertGreaterEqual(len(chunks), 5)
+
+    def test_same_html_as_plain_render(self):
+        for url in (reverse('posts:follow_index'),
+                    reverse('posts:search') + '?q=Пост'):
+            with self.subTest(url=url):
+                streamed = b''.join(self.client.get(url).streaming_content)
+                with override_settings(STREAM_PAGES=False):
+                    plain = self.client.get(url)
+                self.assertFalse(plain.streaming)
+                self.assertEqual(
+                    streamed.split(), plain.content.split()
+                )
+                self.assertEqual(streamed.count(b'<hr>'), 2)
+
+    def test_feed_is_read_after_head(self):
+        url = reverse('posts:follow_index')
+        # Число постов ленты уже в кэше.
+        b''.join(self.client.get(url).streaming_content)
+        # Сессия, пользователь, подписки на популярных авторов
+        # и на группы.
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertIsInstance(response.context['page_obj'], Page)
+        chunks = iter(response.streaming_content)
+        with self.assertNumQueries(0):
+            next(chunks)
+        self.assertIn(b'<article>', b''.join(chunks))
@@ -0,0 +1,121 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from .. import thumbnails
+from ..cards import (
+    PLACEHOLDER_TIMEOUT, card_key, card_rows, render_cards
+)
+from ..models import Post
+from ..utils import MAX_POST_DISPLAYED
+from .test_cards import SMALL_GIF
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailTests(TransactionTestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        queue = mock.patch.object(thumbnails.jobs, 'queue')
+        self.queued = queue.start()
+        self.addCleanup(queue.stop)
+        self.user = User.objects.create_user(username='Nameless')
+        self.client.force_login(self.user)
+
+    def create_post(self):
+        self.client.post(reverse('posts:post_create'), {
+            'text': 'С картинкой',
+            'image': SimpleUploadedFile('small.gif', SMALL_GIF, 'image/gif'),
+        })
+        return Post.objects.latest('pk')
+
+    def test_upload_queues_thumbnails(self):
+        post = self.create_post()
+        self.queued.assert_called_with(post.image.name)
+
+    def test_placeholder_until_generated(self):
+        post = self.create_post()
+        with mock.patch.object(thumbnails, 'get_thumbnail') as resize:
+            card, = render_cards([post])
+            self.client.get(reverse('posts:post_detail', args=(post.pk,)))
+        resize.assert_not_called()
+        self.assertIn('src="data:image/svg+xml,', card)
+
+        thumbnails.generate(post.image.name)
+        updated = Post.objects.get()
+        self.assertGreater(updated.updated_at, post.updated_at)
+        card, = render_cards([updated])
+        self.assertIn(f'src="{settings.MEDIA_URL}cache/', card)
+        response = self.client.get(reverse('posts:index'))
+        self.assertContains(response, f'src="{settings.MEDIA_URL}cache/')
+
+    def test_placeholder_card_is_kept_briefly(self):
+        post = self.create_post()
+        self.queued.reset_mock()
+        with mock.patch.object(
+            cache, 'set_many', wraps=cache.set_many
+        ) as set_many:
+            card, = render_cards([post])
+        self.assertIn('src="data:image/svg+xml,', card)
+        set_many.assert_any_call(
+            {card_key(post): mock.ANY}, PLACEHOLDER_TIMEOUT
+        )
+        self.queued.assert_called_once_with(post.image.name)
+
+        # Задача потерялась: после истечения заглушки — снова в очередь.
+        cache.delete(card_key(post))
+        render_cards([post])
+        self.assertEqual(self.queued.call_count, 2)
+
+    def test_page_resolves_thumbnails_at_once(self):
+        for _ in range(MAX_POST_DISPLAYED):
+            thumbnails.generate(self.create_post().image.name)
+        posts = list(Post.objects.select_related('author'))
+        cache.clear()
+        # Карточки и записи sorl — один get_many из кэша каждые,
+        # промахи sorl — один запрос в базу, сколько бы пачек
+        # ни отдавал card_rows.
+        with self.assertNumQueries(1):
+            cards = [card for _, card in card_rows(posts)]
+        with self.assertNumQueries(0):
+            thumbnails.resolve(
+                [post.image for post in posts], '960x339',
+                crop='center', upscale=True,
+            )
+        for card in cards:
+            self.assertIn(f'src="{settings.MEDIA_URL}cache/', card)
+
+    def test_no_jobs_in_read_only_mode(self):
+        jobs = thumbnails.Jobs()
+        with mock.patch.object(jobs, 'pool') as pool, \
+                mock.patch.object(thumbnails, 'generate') as generate, \
+                self.settings(READ_ONLY=True):
+            jobs.queue('posts/a.gif')
+            jobs.run('posts/a.gif')
+        pool.assert_not_called()
+        generate.assert_not_called()
+
+    def test_jobs_are_not_repeated(self):
+        jobs = thumbnails.Jobs()
+        with mock.patch.object(jobs, 'pool') as pool:
+            jobs.queue('posts/a.gif')
+            jobs.queue('posts/a.gif')
+            thumbnails.Jobs().queue('posts/a.gif')
+        pool.return_value.submit.assert_called_once_with(
+            jobs.run, 'posts/a.gif'
+        )
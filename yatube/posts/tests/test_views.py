@@ -1,5 +1,6 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django import forms
 from django.conf import settings
@@ -10,7 +11,7 @@ from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
 from ..models import Group, Post, Follow
-from ..utils import MAX_POST_DISPLAYED
+from ..utils import MAX_POST_DISPLAYED, encode_cursor, page_window
 
 User = get_user_model()
 
@@ -55,6 +56,9 @@ class PostPagesTests(TestCase):
         shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
 
     def setUp(self):
+        # Страницы кэшируются целиком; контекст и шаблоны видны
+        # в тестах только при настоящем рендере.
+        cache.clear()
         self.authorized_client = Client()
         self.authorized_client.force_login(self.author)
 
@@ -205,6 +209,77 @@ class PostPagesTests(TestCase):
             test_second_page_count
         )
 
+    def test_cursor_pagination(self):
+        first_page = self.client.get(reverse('posts:index'))
+        last_post = first_page.context['page_obj'][-1]
+        response = self.client.get(
+            reverse('posts:index') + '?after=' + encode_cursor(last_post)
+        )
+        page_obj = response.context['page_obj']
+        self.assertTrue(page_obj.is_cursor)
+        self.assertEqual(
+            list(page_obj),
+            list(Post.objects.order_by('-pub_date', '-pk')[
+                MAX_POST_DISPLAYED:MAX_POST_DISPLAYED * 2
+            ])
+        )
+        self.assertTrue(page_obj.has_previous())
+        self.assertFalse(page_obj.has_next())
+        response = self.client.get(
+            reverse('posts:index') + '?before=' + page_obj.previous_cursor
+        )
+        self.assertEqual(
+            list(response.context['page_obj']),
+            list(first_page.context['page_obj'])
+        )
+        self.assertFalse(response.context['page_obj'].has_previous())
+
+    def test_deep_page_numbers_switch_to_cursors(self):
+        cache.clear()
+        with mock.patch('posts.utils.NUMBERED_PAGES', 1):
+            response = self.client.get(reverse('posts:index') + '?page=2')
+        page_obj = response.context['page_obj']
+        self.assertEqual(page_obj.number, 1)
+        self.assertEqual(page_obj.next_cursor, encode_cursor(page_obj[-1]))
+        self.assertContains(response, '?after=' + page_obj.next_cursor)
+        self.assertNotContains(response, '?page=2')
+        self.assertNotContains(response, 'Последняя')
+
+    def test_non_positive_page_numbers_give_first_page(self):
+        for page in ('0', '-3'):
+            with self.subTest(page=page):
+                response = self.client.get(
+                    reverse('posts:index') + '?page=' + page
+                )
+                self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_broken_cursor_falls_back_to_first_page(self):
+        response = self.client.get(reverse('posts:index') + '?after=%%%')
+        self.assertEqual(response.context['page_obj'].number, 1)
+
+    def test_paginator_renders_page_window(self):
+        self.assertEqual(
+            list(page_window(25, 50)),
+            [1, None, 23, 24, 25, 26, 27, None, 50]
+        )
+        self.assertEqual(list(page_window(2, 50)), [1, 2, 3, 4, None, 50])
+        self.assertEqual(list(page_window(1, 1)), [1])
+
+    def test_cached_count_invalidated_on_create_and_delete(self):
+        cache.clear()
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        count = self.client.get(url).context['page_obj'].paginator.count
+        post = Post.objects.create(
+            text='Ещё один пост', author=self.author, group=self.group
+        )
+        response = self.client.get(url)
+        self.assertEqual(
+            response.context['page_obj'].paginator.count, count + 1
+        )
+        post.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.context['page_obj'].paginator.count, count)
+
     def test_post_detail_shows_correct_context(self):
         response = (
             self.authorized_client.get(reverse(
@@ -245,10 +320,57 @@ class PostPagesTests(TestCase):
         cache.clear()
         response = self.authorized_client.get(reverse('posts:index'))
         cached_response = response.content
-        post = Post.objects.get(pk=1)
-        post.delete()
+        post = response.context['page_obj'][0]
+        # update() обходит сигналы: фрагмент остаётся в кэше.
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
         response = self.authorized_client.get(reverse('posts:index'))
         self.assertEqual(response.content, cached_response)
+        post.delete()
+        response = self.authorized_client.get(reverse('posts:index'))
+        self.assertNotEqual(response.content, cached_response)
+
+    def test_post_cards_are_cached_by_version(self):
+        cache.clear()
+        url = reverse('posts:index')
+        post = self.authorized_client.get(url).context['page_obj'][0]
+        # Без сохранения версия карточки та же: страница собирается
+        # заново (новый пост), но старая карточка берётся из кэша.
+        Post.objects.filter(pk=post.pk).update(text='Тихая правка')
+        Post.objects.create(text='Соседний пост', author=self.author)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Соседний пост')
+        self.assertNotContains(response, 'Тихая правка')
+        post.refresh_from_db()
+        updated_at = post.updated_at
+        post.text = 'Громкая правка'
+        post.save()
+        self.assertGreater(post.updated_at, updated_at)
+        response = self.authorized_client.get(url)
+        self.assertContains(response, 'Громкая правка')
+
+    def test_fragments_refresh_after_writes(self):
+        cache.clear()
+        pages = (
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile', kwargs={'username': 'Nameless'}),
+        )
+        for url in pages:
+            self.authorized_client.get(url)
+        post = Post.objects.create(
+            text='Свежий пост', author=self.author, group=self.group
+        )
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Свежий пост')
+        self.author.first_name = 'Безымянный'
+        self.author.save()
+        for url in pages:
+            with self.subTest(url=url):
+                response = self.authorized_client.get(url)
+                self.assertContains(response, 'Безымянный')
+        post.delete()
 
     def test_follow_author(self):
         before_follow_count = (
@@ -0,0 +1,235 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from django.utils.html import escape
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore
+)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+from sorl.thumbnail.parsers import parse_geometry
+
+from .fragments import bump, post_scopes
+from .models import Post
+
+logger = logging.getLogger(__name__)
+
+# Миниатюры, которые нужны шаблонам: создаются сразу после загрузки
+# картинки, при рендере страницы только ищутся.
+GEOMETRIES = (
+    ('960x339', {'crop': 'center', 'upscale': True}),
+)
+# Пока задача в работе, другие процессы её не повторяют.
+JOB_TIMEOUT = 5 * 60
+PLACEHOLDER = (
+    "<svg xmlns='http://www.w3.org/2000/svg' viewBox='0 0 {} {}'>"
+    "<rect width='100%' height='100%' fill='#e9ecef'/></svg>"
+)
+
+
+class LookupBackend(ThumbnailBackend):
+    """ThumbnailBackend, который умеет только искать готовое."""
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        """ImageFile, под которым sorl сохранит миниатюру. Картинку
+        не открывает и не ресайзит."""
+        source = ImageFile(file_)
+        # Опции — как в ThumbnailBackend.get_thumbnail, иначе имя
+        # файла миниатюры не совпадёт.
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return ImageFile(name, default.storage)
+
+    def lookup(self, file_, geometry_string, **options):
+        """Готовая миниатюра из key-value store или None."""
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options)
+        )
+
+    def lookup_many(self, files, geometry_string, **options):
+        """lookup() для многих картинок сразу: {имя: миниатюра или
+        None}. Для cached_db-хранилища sorl это один get_many из кэша
+        и один запрос в базу за промахи."""
+        wanted = {
+            getattr(file_, 'name', file_): self.thumbnail_file(
+                file_, geometry_string, **options
+            )
+            for file_ in files
+        }
+        kvstore = default.kvstore
+        if not isinstance(kvstore, CachedDBKVStore):
+            return {
+                name: kvstore.get(thumbnail)
+                for name, thumbnail in wanted.items()
+            }
+        keys = {
+            name: add_prefix(thumbnail.key)
+            for name, thumbnail in wanted.items()
+        }
+        values = kvstore.cache.get_many(list(keys.values()))
+        missing = [key for key in keys.values() if key not in values]
+        if missing:
+            stored = dict(KVStoreModel.objects.filter(
+                key__in=missing
+            ).values_list('key', 'value'))
+            # Как в KVStore._get_raw: отсутствие тоже запоминаем,
+            # чтобы не ходить в базу снова.
+            found = {key: stored.get(key, EMPTY_VALUE) for key in missing}
+            kvstore.cache.set_many(
+                found, sorl_settings.THUMBNAIL_CACHE_TIMEOUT
+            )
+            values.update(found)
+        return {
+            name: (
+                None if values[key] == EMPTY_VALUE or not values[key]
+                else deserialize_image_file(values[key])
+            )
+            for name, key in keys.items()
+        }
+
+
+backend = LookupBackend()
+
+
+class Jobs:
+    """Пул потоков, в котором создаются миниатюры.
+
+    Одна и та же картинка в очередь не попадает дважды: в процессе
+    это следит множество pending, между процессами — ключ в кэше.
+    """
+
+    def __init__(self):
+        self.executor = None
+        self.pending = set()
+        self.lock = threading.Lock()
+
+    def queue(self, name):
+        if read_only():
+            return
+        with self.lock:
+            if name in self.pending:
+                return
+            self.pending.add(name)
+        if not cache.add(job_key(name), 1, JOB_TIMEOUT):
+            with self.lock:
+                self.pending.discard(name)
+            return
+        self.pool().submit(self.run, name)
+
+    def pool(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(
+                    max_workers=settings.THUMBNAIL_WORKERS,
+                    thread_name_prefix='thumbnails',
+                )
+            return self.executor
+
+    def run(self, name):
+        try:
+            # Режим мог включиться, пока задача ждала в очереди.
+            if not read_only():
+                generate(name)
+        except Exception:
+            logger.exception('Не удалось создать миниатюры %s', name)
+        finally:
+            cache.delete(job_key(name))
+            with self.lock:
+                self.pending.discard(name)
+            close_old_connections()
+
+
+jobs = Jobs()
+
+
+def read_only():
+    """В режиме только чтения миниатюры не создаются: пул пишет
+    в базу мимо ReadOnlyMiddleware, а страницы обойдутся заглушками."""
+    return getattr(settings, 'READ_ONLY', False)
+
+
+def job_key(name):
+    return f'posts:thumbnails:job:{name}'
+
+
+def queue(name):
+    """Создать миниатюры в фоне, когда пост уже сохранён в базе
+    (вне транзакции — сразу)."""
+    transaction.on_commit(lambda: jobs.queue(name))
+
+
+def generate(name):
+    """Создаёт недостающие миниатюры картинки и сбрасывает кэш
+    карточек и страниц с её постами."""
+    missing = [
+        (geometry, options) for geometry, options in GEOMETRIES
+        if backend.lookup(name, geometry, **options) is None
+    ]
+    if not missing:
+        return
+    for geometry, options in missing:
+        get_thumbnail(name, geometry, **options)
+    posts = Post.objects.filter(image=name)
+    # Новая версия поста — новый ключ его карточки в кэше.
+    posts.update(updated_at=timezone.now())
+    for pk, author_id, group_id in posts.values_list(
+        'pk', 'author_id', 'group_id'
+    ):
+        bump(f'post:{pk}', *post_scopes(author_id, group_id))
+
+
+def resolve(images, geometry, **options):
+    """{имя картинки: готовая миниатюра или None} одним обращением
+    к хранилищу sorl. Отсутствующие миниатюры ставит в очередь."""
+    images = [image for image in images if image]
+    if not images:
+        return {}
+    try:
+        found = backend.lookup_many(images, geometry, **options)
+    except Exception:
+        if sorl_settings.THUMBNAIL_DEBUG:
+            raise
+        logger.exception('Не удалось найти миниатюры %s', images)
+        return {}
+    for name, thumbnail in found.items():
+        if thumbnail is None:
+            queue(name)
+    return found
+
+
+def placeholder(geometry):
+    width, height = parse_geometry(geometry)
+    width = width or height
+    height = height or width
+    return 'data:image/svg+xml,' + quote(PLACEHOLDER.format(width, height))
+
+
+def image_tag(image, geometry, css_class='', resolved=None, **options):
+    """<img> миниатюры, пока её нет — заглушка нужных пропорций,
+    без картинки — пустая строка. resolved — результат resolve()
+    для целой страницы, иначе миниатюра ищется отдельно."""
+    if not image:
+        return ''
+    if resolved is None:
+        resolved = resolve([image], geometry, **options)
+    thumbnail = resolved.get(getattr(image, 'name', image))
+    src = thumbnail.url if thumbnail is not None else placeholder(geometry)
+    return f'<img class="{escape(css_class)}" src="{escape(src)}">'
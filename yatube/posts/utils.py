@@ -1,12 +1,266 @@
+import base64
+import binascii
+
+from django.core.cache import cache
 from django.core.paginator import Paginator, Page
 from django.db.models import QuerySet
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+from .feeds import PostStream
 
 MAX_POST_DISPLAYED: int = 10
+# Номерные страницы отдаются только в начале ленты: дальше ссылка
+# «Следующая» переключает пагинацию на курсоры по (pub_date, id).
+NUMBERED_PAGES: int = 5
+# Сколько номеров страниц показывать по обе стороны от текущей.
+PAGE_WINDOW: int = 2
+COUNT_CACHE_TIMEOUT: int = 60 * 60
+
+
+def count_cache_key(feed: str) -> str:
+    return f'posts:count:{feed}'
+
+
+def invalidate_counts(*feeds: str) -> None:
+    cache.delete_many([count_cache_key(feed) for feed in feeds])
+
+
+def encode_cursor(post) -> str:
+    raw = f'{post.pub_date.isoformat()}|{post.pk}'.encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token: str):
+    """Возвращает (pub_date, id) или None для битого курсора."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode()).decode()
+        pub_date, pk = raw.rsplit('|', 1)
+        pub_date = parse_datetime(pub_date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeError, ValueError):
+        return None
+    if pub_date is None:
+        return None
+    return pub_date, pk
+
+
+def page_window(number, num_pages, on_each_side=PAGE_WINDOW):
+    """Первая, последняя и соседние с текущей страницы;
+    None обозначает пропуск."""
+    left = max(number - on_each_side, 1)
+    right = min(number + on_each_side, num_pages)
+    if left > 1:
+        yield 1
+        if left > 2:
+            yield None
+    yield from range(left, right + 1)
+    if right < num_pages:
+        if right < num_pages - 1:
+            yield None
+        yield num_pages
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, который берёт COUNT(*) из кэша.
+
+    Если число объектов уже известно (денормализованный счётчик),
+    его передают в known_count, и COUNT(*) не выполняется вовсе.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None,
+                 known_count=None):
+        super().__init__(object_list, per_page)
+        self.count_key = count_key
+        self.known_count = known_count
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        if self.count_key is None:
+            return super().count
+        key = count_cache_key(self.count_key)
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class LazyRows:
+    """Срез ленты, который читается из базы при первом обращении.
+
+    Страница создаётся во view сразу, а её строки запрашиваются
+    только при рендере: у потоковых страниц — уже после отправки
+    начала страницы.
+    """
+
+    def __init__(self, fetch):
+        self.fetch = fetch
+
+    @cached_property
+    def rows(self):
+        return list(self.fetch())
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, item):
+        return self.rows[item]
+
+
+class LazySlices:
+    """Лента из posts.feeds или результаты поиска, срезы которых
+    (как срезы QuerySet) не выполняются сразу."""
+
+    def __init__(self, object_list):
+        self.object_list = object_list
+
+    def count(self):
+        return self.object_list.count()
+
+    def __getitem__(self, item):
+        return LazyRows(lambda: self.object_list[item])
+
+
+class CursorPaginator(Paginator):
+    """Keyset-пагинация: страница — один диапазонный скан по индексу
+    (pub_date, id) без COUNT(*) и OFFSET."""
+
+    def __init__(self, object_list, per_page, after=None, before=None):
+        if isinstance(object_list, QuerySet):
+            object_list = PostStream(object_list)
+        super().__init__(object_list, per_page)
+        self.after = after
+        self.before = before
+
+    def cursor_page(self):
+        return CursorPage(self)
+
+    def window(self):
+        """(строки страницы, есть ли предыдущая, есть ли следующая)."""
+        posts = self.object_list
+        limit = self.per_page + 1
+        if self.before is not None:
+            rows = posts.newer_than(self.before, limit)
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            if self.after is not None:
+                rows = posts.older_than(self.after, limit)
+            else:
+                rows = posts.newest(limit)
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = self.after is not None
+        return rows, has_previous, has_next and bool(rows)
+
+
+class CursorPage(Page):
+    """Страница курсорной пагинации; строки, как и у номерных
+    страниц, читаются при первом обращении."""
+
+    is_cursor = True
+
+    def __init__(self, paginator):
+        super().__init__(
+            LazyRows(lambda: self._window[0]), None, paginator
+        )
+
+    @cached_property
+    def _window(self):
+        return self.paginator.window()
+
+    @property
+    def _has_previous(self):
+        return self._window[1]
+
+    @property
+    def _has_next(self):
+        return self._window[2]
+
+    def __repr__(self):
+        return f'<Cursor page {self.cursor}>'
+
+    @property
+    def cursor(self):
+        return encode_cursor(self.object_list[0]) if self.object_list else ''
+
+    @property
+    def previous_cursor(self):
+        if self._has_previous and self.object_list:
+            return encode_cursor(self.object_list[0])
+        return None
+
+    @property
+    def next_cursor(self):
+        if self._has_next:
+            return encode_cursor(self.object_list[-1])
+        return None
+
+    def has_next(self):
+        return self._has_next
+
+    def has_previous(self):
+        return self._has_previous
+
+
+def clamp_page(page_number):
+    try:
+        return max(1, min(int(page_number), NUMBERED_PAGES))
+    except (TypeError, ValueError):
+        return page_number
 
 
 def get_page_obj(request,
-                 post_list: QuerySet) -> Page:
-    paginator = Paginator(post_list, MAX_POST_DISPLAYED)
+                 post_list,
+                 count_key: str = None,
+                 keyset: bool = True,
+                 count: int = None) -> Page:
+    """post_list — QuerySet постов или лента из posts.feeds.
+
+    count — заранее известное число постов (например, из UserStats);
+    с ним пагинатор не считает их ни в базе, ни в кэше.
+
+    keyset=False отключает курсоры для списков, упорядоченных не по
+    времени (например, результатов поиска).
+    """
+    for direction in ('after', 'before'):
+        token = request.GET.get(direction)
+        key = decode_cursor(token) if token and keyset else None
+        if key is not None:
+            paginator = CursorPaginator(
+                post_list, MAX_POST_DISPLAYED, **{direction: key}
+            )
+            return paginator.cursor_page()
+
+    if isinstance(post_list, QuerySet):
+        post_list = post_list.order_by('-pub_date', '-pk')
+    else:
+        post_list = LazySlices(post_list)
+    paginator = CachedCountPaginator(
+        post_list,
+        MAX_POST_DISPLAYED,
+        count_key=count_key,
+        known_count=count,
+    )
     page_number = request.GET.get('page')
+    if keyset:
+        # Глубокие ?page=N (их обходят краулеры) не доходят до больших
+        # OFFSET: дальше NUMBERED_PAGES отдаётся последняя номерная
+        # страница, с которой «Следующая» ведёт по курсору.
+        page_number = clamp_page(page_number)
     page_posts = paginator.get_page(page_number)
+    page_posts.next_cursor = None
+    page_posts.last_number = paginator.num_pages
+    if keyset:
+        page_posts.last_number = min(paginator.num_pages, NUMBERED_PAGES)
+        if page_posts.number >= NUMBERED_PAGES and page_posts.has_next():
+            page_posts.next_cursor = encode_cursor(page_posts[-1])
     return page_posts
@@ -1,64 +1,80 @@
 from django.contrib.auth.decorators import login_required
 
+from django.http import JsonResponse
 from django.shortcuts import render, get_object_or_404, redirect
+from .autocomplete import suggestions
+from .feeds import follow_feed
+from .fragments import generations
+from .pages import (
+    detail_scopes, group_scopes, index_scopes, profile_scopes, shared_page
+)
+from .search import SearchResults
+from .streaming import stream
 from .utils import get_page_obj
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import Group, Post, User, Follow, UserStats
 
 
+@shared_page(index_scopes)
 def index(request):
     posts = Post.objects.select_related(
         'author',
         'group'
     ).all()
-    page_obj = get_page_obj(request, posts)
+    page_obj = get_page_obj(request, posts, count_key='index')
 
     template = 'posts/index.html'
 
     context = {
         'page_obj': page_obj,
+        'generation': generations('index'),
     }
 
     return render(request, template, context)
 
 
+@shared_page(group_scopes)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
     posts = group.posts.select_related('author')
-    page_obj = get_page_obj(request, posts)
+    page_obj = get_page_obj(request, posts, count_key=f'group:{group.pk}')
     template = 'posts/group_list.html'
 
     context = {
         'group': group,
         'page_obj': page_obj,
+        'generation': generations(f'group:{group.pk}', 'authors'),
     }
     return render(request, template, context)
 
 
+@shared_page(profile_scopes)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username
+    )
     posts = author.posts.all()
-    page_obj = get_page_obj(request, posts)
+    stats = UserStats.for_user(author)
+    page_obj = get_page_obj(request, posts, count=stats.posts_count)
 
     template = 'posts/profile.html'
-    following = False
-    if request.user.is_authenticated:
-        following = Follow.objects.filter(user=request.user,
-                                          author=author).exists()
-    author_posts_count = author.posts.count()
 
     context = {
         'author': author,
         'page_obj': page_obj,
-        'author_posts_count': author_posts_count,
-        'following': following,
+        'author_posts_count': stats.posts_count,
+        'stats': stats,
+        'generation': generations(f'profile:{author.pk}', 'groups'),
     }
     return render(request, template, context)
 
 
+@shared_page(detail_scopes)
 def post_detail(request, post_id):
-    full_post = get_object_or_404(Post, pk=post_id)
-    author_posts_count = full_post.author.posts.count()
+    full_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id
+    )
+    author_posts_count = UserStats.for_user(full_post.author).posts_count
     form = CommentForm(request.POST or None)
     comments = full_post.comments.all()
     template = 'posts/post_detail.html'
@@ -71,6 +87,23 @@ def post_detail(request, post_id):
     return render(request, template, context)
 
 
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = get_page_obj(request, SearchResults(query), keyset=False)
+    template = 'posts/search.html'
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return stream(request, template, context)
+
+
+def autocomplete(request):
+    query = request.GET.get('q', '').strip()
+    results = suggestions.search(query) if query else []
+    return JsonResponse({'results': results})
+
+
 @login_required
 def post_create(request):
     form = PostForm(
@@ -127,11 +160,14 @@ def add_comment(request, post_id):
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
-    page_obj = get_page_obj(request, posts)
+    # Строки ленты читаются, когда начало страницы уже ушло клиенту.
+    feed = follow_feed(request.user)
+    page_obj = get_page_obj(
+        request, feed, count_key=feed.count_key(f'follow:{request.user.pk}')
+    )
     template = 'posts/follow.html'
     context = {'page_obj': page_obj}
-    return render(request, template, context)
+    return stream(request, template, context)
 
 
 @login_required
@@ -166,3 +202,17 @@ def profile_unfollow(request, username):
         'posts:profile',
         username=username
     )
+
+
+@login_required
+def group_follow(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    Follow.objects.get_or_create(user=request.user, group=group)
+    return redirect('posts:group_list', slug=slug)
+
+
+@login_required
+def group_unfollow(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    Follow.objects.filter(user=request.user, group=group).delete()
+    return redirect('posts:group_list', slug=slug)
@@ -0,0 +1,37 @@
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.test import RequestFactory
+from django.urls import resolve, reverse
+
+from .models import Group, UserStats
+
+
+def warmup_urls(pages, profiles):
+    """Адреса, с которых посетители чаще всего начинают: первые
+    страницы главной, все группы и самые читаемые авторы."""
+    index = reverse('posts:index')
+    yield index
+    for number in range(2, pages + 1):
+        yield f'{index}?page={number}'
+    for slug in Group.objects.values_list('slug', flat=True).iterator():
+        yield reverse('posts:group_list', kwargs={'slug': slug})
+    top = UserStats.objects.order_by('-followers_count').values_list(
+        'user__username', flat=True
+    )[:profiles]
+    for username in top:
+        yield reverse('posts:profile', kwargs={'username': username})
+
+
+def warm(url):
+    """Рендерит страницу как для анонима: оболочка, фрагменты
+    и миниатюры попадают в кэш и достаются всем пользователям."""
+    request = RequestFactory().get(url)
+    request.user = AnonymousUser()
+    match = resolve(request.path_info)
+    request.resolver_match = match
+    try:
+        response = match.func(request, *match.args, **match.kwargs)
+    finally:
+        # Воркеры пула — отдельные потоки со своими соединениями.
+        connection.close()
+    return response.status_code
@@ -10,7 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/2.2/ref/settings/
 """
 
+import atexit
 import os
+import shutil
+import sys
+import tempfile
 
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 
@@ -51,12 +55,14 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'core.middleware.ReadOnlyMiddleware',
 ]
 
 ROOT_URLCONF = 'yatube.urls'
@@ -127,6 +133,10 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.2/howto/static-files/
 
 STATIC_URL = '/static/'
+# manage.py collectstatic собирает сюда файлы с хешем в имени и их
+# сжатые копии; в продакшене их отдаёт core.static.StaticFiles.
+STATIC_ROOT = os.path.join(BASE_DIR, 'collected_static')
+STATICFILES_STORAGE = 'core.static.CompressedManifestStorage'
 
 LOGIN_URL = 'users:login'
 LOGIN_REDIRECT_URL = 'posts:index'
@@ -139,9 +149,67 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
+# Кто отдаёт байты медиафайлов после проверки в core.media.serve:
+# None — сам Django, 'nginx' — X-Accel-Redirect на internal-location
+# MEDIA_ACCEL_PREFIX, 'sendfile' — X-Sendfile (Apache, lighttpd).
+MEDIA_ACCEL = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+# Сколько потоков процесса создают миниатюры загруженных картинок
+# (posts.thumbnails); при рендере страниц картинки не ресайзятся.
+THUMBNAIL_WORKERS = 2
+
+# Кэш в файле SQLite общий для всех воркеров на машине: инвалидация
+# из одного процесса видна остальным. Перед ним — небольшой LRU
+# в памяти процесса; изменённые ключи остальные процессы выбрасывают
+# из него не позже чем через POLL_INTERVAL секунд.
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+        'BACKEND': 'core.cache.TieredCache',
+        'LOCATION': 'default',
+        'OPTIONS': {
+            'SHARED': 'shared',
+            'MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 5,
+            'POLL_INTERVAL': 0.5,
+        },
+    },
+    'shared': {
+        'BACKEND': 'core.cache.SQLiteCache',
+        'LOCATION': os.path.join(BASE_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
 }
+
+# Тесты (manage.py test, pytest) получают свой файл кэша: общий кэш
+# работающих на машине процессов они не читают и не очищают.
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+if TESTING:
+    TEST_CACHE_DIR = tempfile.mkdtemp(prefix='yatube-cache-')
+    atexit.register(shutil.rmtree, TEST_CACHE_DIR, ignore_errors=True)
+    CACHES['shared']['LOCATION'] = os.path.join(
+        TEST_CACHE_DIR, 'cache.sqlite3'
+    )
+
+# Лента подписок: посты авторов, у которых подписчиков меньше порога,
+# раскладываются по лентам читателей при публикации; посты остальных
+# подмешиваются при чтении.
+FEED_FANOUT_THRESHOLD = 1000
+FEED_BACKFILL_SIZE = 1000
+# Посты автора, опустившегося ниже порога, раскладываются по лентам
+# в фоне пачками по FEED_REFILL_BATCH строк, а до тех пор, пока
+# подписчиков не меньше FEED_DEMOTE_THRESHOLD, ещё и подмешиваются
+# при чтении: колебания около порога не теряют постов.
+FEED_DEMOTE_THRESHOLD = 800
+FEED_REFILL_BATCH = 5000
+
+# Сколько секунд кэшируемая страница может ждать базу; дольше —
+# отдаём последнюю удачную версию из кэша.
+PAGE_LATENCY_BUDGET = 2
+# Личные списки (лента подписок, поиск) отдаются потоком: начало
+# страницы уходит до запросов к ленте (см. posts.streaming).
+STREAM_PAGES = True
+# Только чтение (например, на время обслуживания базы): формы и
+# подписки отключены, страницы открываются как обычно.
+READ_ONLY = False
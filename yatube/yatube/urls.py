@@ -1,8 +1,10 @@
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import include, path
 
+from core.media import serve as serve_media
+from core.resize import serve as serve_resized
+
 handler404 = 'core.views.page_not_found'
 handler500 = 'core.views.server_error'
 handler403 = 'core.views.permission_denied'
@@ -13,9 +15,15 @@ urlpatterns = [
     path('about/', include('about.urls', namespace='about')),
     path('admin/', admin.site.urls),
     path('auth/', include('django.contrib.auth.urls')),
+    path(
+        settings.MEDIA_URL.lstrip('/')
+        + 'r/<int:width>x<int:height>/<slug:crop>/<path:path>',
+        serve_resized,
+        name='resize',
+    ),
+    path(
+        settings.MEDIA_URL.lstrip('/') + '<path:path>',
+        serve_media,
+        name='media',
+    ),
 ]
-
-if settings.DEBUG:
-    urlpatterns += static(
-        settings.MEDIA_URL, document_root=settings.MEDIA_ROOT
-    )